@@ -1,16 +1,31 @@
-from fastapi import FastAPI, HTTPException, Header, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, status, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from prisma import Prisma
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from prisma import Prisma, Base64, Json
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from jose import JWTError, jwt
 import traceback
+import asyncio
+import uuid
+import struct
+import zlib
+import bisect
+import base64
+import json
+import time
+import math
+import random
 import os
 from dotenv import load_dotenv
-
-import requests
+import numpy as np
+import httpx
 
 # .env dosyasını yükle
 load_dotenv()
@@ -25,8 +40,66 @@ try:
 except:
     ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 30
 
-app = FastAPI(title="OtoLog API - Car Search V8")
-prisma = Prisma()
+# --- VERİTABANI BAĞLANTISI ---
+
+# Havuz boyutu worker başınadır: toplam bağlantı = worker sayısı x DB_POOL_SIZE.
+# DB_POOL_SIZE verilmezse DB_MAX_CONNECTIONS, WEB_CONCURRENCY worker'a bölünür;
+# ikisi de yoksa Prisma varsayılanı (num_cpus * 2 + 1) kullanılır.
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0")) or (
+    max(2, DB_MAX_CONNECTIONS // WEB_CONCURRENCY) if DB_MAX_CONNECTIONS else 0
+)
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))        # havuzdan bağlantı bekleme (sn)
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))  # Postgres'e bağlanma (sn)
+DB_QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "30"))    # tek sorgu için engine HTTP süresi (sn)
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "5"))
+
+def with_pool_params(url: str) -> str:
+    # Prisma havuz ayarları datasource URL parametreleriyle verilir
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    if DB_POOL_SIZE:
+        query["connection_limit"] = str(DB_POOL_SIZE)
+    query["pool_timeout"] = str(DB_POOL_TIMEOUT)
+    query["connect_timeout"] = str(DB_CONNECT_TIMEOUT)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def make_prisma(url: Optional[str]) -> Prisma:
+    kwargs = {
+        "connect_timeout": timedelta(seconds=DB_CONNECT_TIMEOUT),
+        "http": {"timeout": DB_QUERY_TIMEOUT}
+    }
+    if url:
+        kwargs["datasource"] = {"url": with_pool_params(url)}
+    return Prisma(**kwargs)
+
+async def connect_prisma(client: Prisma):
+    # Yeniden başlatmalarda tüm worker'lar aynı anda bağlanmasın diye jitter'lı geri çekilme
+    for attempt in range(1, DB_CONNECT_RETRIES + 1):
+        try:
+            await client.connect()
+            return
+        except Exception as e:
+            if attempt == DB_CONNECT_RETRIES:
+                raise
+            delay = min(2 ** attempt, 30) * random.uniform(0.5, 1.0)
+            print(f"DB CONNECT ERROR (deneme {attempt}): {e}; {delay:.1f} sn sonra tekrar denenecek")
+            await asyncio.sleep(delay)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bağlantı ve ısınma trafik kabul edilmeden önce yapılır (startup/shutdown dosya sonunda)
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+app = FastAPI(title="OtoLog API - Car Search V8", lifespan=lifespan)
+prisma = make_prisma(os.getenv("DATABASE_URL"))
+# Isınma bitince True, kapanırken tekrar False (/ready)
+app_ready = False
 
 try:
     import meilisearch
@@ -40,11 +113,36 @@ except Exception as e:
     meili_client = None
     print("Meilisearch not configured:", e)
 
-# Helper for DB connection check (avoiding redundant calls)
-async def get_prisma():
-    if not prisma.is_connected():
-        await prisma.connect()
-    return prisma
+# Büyük konum paketleri için opsiyonel COPY yolu (asyncpg yoksa Prisma create_many kullanılır)
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+# Yanıt önbelleği için opsiyonel harici backend (RESPONSE_CACHE_URL=redis://...)
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+# Hızlı JSON (yoksa standart json ile aynı çıktı) ve opsiyonel brotli sıkıştırma
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Meilisearch istemcisi senkron; çağrılar event loop'u bloklamasın diye sınırlı bir thread havuzunda çalışır
+MEILI_WORKERS = int(os.getenv("MEILI_WORKERS", "4"))
+meili_executor = ThreadPoolExecutor(max_workers=MEILI_WORKERS, thread_name_prefix="meili")
+
+async def run_meili(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(meili_executor, fn, *args)
 
 
 # CORS
@@ -56,6 +154,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Büyük cevaplar (rota, geçmiş listeleri) mobil ağda sıkıştırılmış gider.
+# Accept-Encoding'e göre br, yoksa gzip; eşiğin altındakiler olduğu gibi kalır.
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_BYTES, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
 # --- MODELLER (Pydantic) ---
 
 class TripStart(BaseModel):
@@ -92,20 +198,1596 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def model_to_dict(model, **kwargs) -> dict:
+    # pydantic v1 / v2 uyumlu
+    return model.model_dump(**kwargs) if hasattr(model, "model_dump") else model.dict(**kwargs)
+
+def json_default(obj):
+    # orjson / json'un tanımadığı tipler (Prisma modelleri pydantic BaseModel'dir)
+    if isinstance(obj, BaseModel):
+        return model_to_dict(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat().replace("+00:00", "Z")
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"JSON'a çevrilemeyen tip: {type(obj).__name__}")
+
+class FastJSONResponse(JSONResponse):
+    # Endpoint'ten doğrudan döndürülünce FastAPI'nin jsonable_encoder gezintisi atlanır;
+    # modeller tek geçişte orjson ile yazılır
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            # UTC zamanlar pydantic'in model çıktısındaki gibi "Z" ile yazılır
+            return orjson.dumps(content, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z)
+        return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+def passthrough_headers(response: Optional[Response]) -> dict:
+    # Depends ile gelen Response'a yazılmış başlıklar (ETag vb.) doğrudan dönen cevaba taşınır
+    if response is None:
+        return {}
+    return {k: v for k, v in response.headers.items() if k != "content-length"}
+
+def fast_json(content, response: Optional[Response] = None) -> FastJSONResponse:
+    return FastJSONResponse(content, headers=passthrough_headers(response))
+
+# --- ÖNBELLEK YARDIMCILARI ---
+
+_MISSING = object()
+
+class TTLCache:
+    # Boyutu sınırlı LRU + TTL önbellek (süreç içi). İsabet/ıska sayaçları boyutlandırma için tutulur.
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key, _MISSING)
+        if item is not _MISSING:
+            expires, value = item
+            if expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0
+        }
+
+class SingleFlight:
+    # Aynı anahtar için eşzamanlı çağrıları tek bir çağrıda birleştirir; herkes aynı sonucu (veya hatayı) alır
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Bekleyenlerden birinin iptal edilmesi ortak çağrıyı iptal etmesin
+        return await asyncio.shield(task)
+
+# --- ROTA YARDIMCILARI ---
+
+EARTH_RADIUS_M = 6371008.8
+
+def zoom_to_tolerance(zoom: int, latitude: float) -> float:
+    # Web Mercator'da verilen zoom seviyesinde 1 pikselin metre karşılığı
+    return 156543.03392 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+def simplify_path(coords: List[tuple], tolerance_m: float) -> List[int]:
+    # Douglas-Peucker: korunacak noktaların indekslerini döner (sıra korunur).
+    # Mesafeler rotanın ortalama enleminde eşdikdörtgen izdüşümle metre cinsinden.
+    n = len(coords)
+    if n < 3 or not tolerance_m or tolerance_m <= 0:
+        return list(range(n))
+
+    ref_lat = math.radians(sum(c[0] for c in coords) / n)
+    kx = EARTH_RADIUS_M * math.cos(ref_lat) * math.pi / 180
+    ky = EARTH_RADIUS_M * math.pi / 180
+    xs = [c[1] * kx for c in coords]
+    ys = [c[0] * ky for c in coords]
+    tol2 = tolerance_m * tolerance_m
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        seg2 = dx * dx + dy * dy
+        max_d2, index = -1.0, -1
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg2 > 0:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+                px -= t * dx
+                py -= t * dy
+            d2 = px * px + py * py
+            if d2 > max_d2:
+                max_d2, index = d2, i
+        if max_d2 > tol2:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [i for i in range(n) if keep[i]]
+
+def encode_polyline(coords: List[tuple], precision: int = 5) -> str:
+    # Google Encoded Polyline Algorithm Format
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        ilat = int(round(lat * factor))
+        ilon = int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else (delta << 1)
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+def haversine_km(lats, lons) -> float:
+    # Ardışık noktalar arasındaki toplam mesafe (km), tek seferde vektörel
+    if len(lats) < 2:
+        return 0.0
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    return float(2 * EARTH_RADIUS_M / 1000 * np.arcsin(np.sqrt(np.clip(a, 0, 1))).sum())
+
+async def iter_trip_points(db, trip_id: str, chunk_size: int):
+    # (timestamp, id) üzerinden keyset sayfalama; bellekte aynı anda en fazla chunk_size nokta tutulur
+    cursor = None
+    while True:
+        where = {"tripId": trip_id}
+        if cursor:
+            last_ts, last_id = cursor
+            where["OR"] = [
+                {"timestamp": {"gt": last_ts}},
+                {"timestamp": {"equals": last_ts}, "id": {"gt": last_id}}
+            ]
+        points = await db.locationpoint.find_many(
+            where=where,
+            order=[{"timestamp": "asc"}, {"id": "asc"}],
+            take=chunk_size
+        )
+        if not points:
+            return
+        yield points
+        if len(points) < chunk_size:
+            return
+        cursor = (points[-1].timestamp, points[-1].id)
+
+# --- PAKETLENMİŞ KONUM FORMATI ---
+# Content-Type: application/x-otolog-points (little-endian)
+#   başlık   : b"OTLP", uint16 sürüm (1), uint32 nokta sayısı (n), int64 başlangıç zamanı (epoch ms)
+#   int32[n] : enlem farkları, 1e-7 derece (ilk eleman mutlak değer)
+#   int32[n] : boylam farkları, 1e-7 derece (ilk eleman mutlak değer)
+#   int32[n] : zaman farkları, ms (ilk eleman başlangıç zamanına göre)
+#   uint16[n]: hız, 0.1 birim
+# Gövde gzip'li gönderilebilir (Content-Encoding: gzip veya gzip sihirli baytları).
+
+PACKED_POINTS_MEDIA_TYPE = "application/x-otolog-points"
+PACKED_MAGIC = b"OTLP"
+PACKED_VERSION = 1
+PACKED_HEADER = struct.Struct("<4sHIq")
+PACKED_BYTES_PER_POINT = 4 + 4 + 4 + 2
+COORD_SCALE = 10_000_000
+SPEED_SCALE = 10
+MAX_PACKED_POINTS = int(os.getenv("MAX_PACKED_POINTS", "50000"))
+MIN_POINT_TIME_MS = 946684800000  # 2000-01-01
+MAX_SPEED = 65535 / SPEED_SCALE
+
+def int32_deltas(values, first, name: str):
+    # Farklar int32'ye sığmazsa (ör. ~24.8 günden uzun zaman atlaması) sessizce taşmasın
+    deltas = np.diff(values, prepend=first)
+    if len(deltas) and (deltas.min() < -2**31 or deltas.max() > 2**31 - 1):
+        raise ValueError(f"{name} farkı int32 aralığını aşıyor")
+    return deltas.astype("<i4")
+
+def pack_points(lats, lons, speeds, times_ms) -> bytes:
+    lat_i = np.round(np.asarray(lats, dtype=np.float64) * COORD_SCALE).astype(np.int64)
+    lon_i = np.round(np.asarray(lons, dtype=np.float64) * COORD_SCALE).astype(np.int64)
+    t = np.asarray(times_ms, dtype=np.int64)
+    speed = np.clip(np.round(np.nan_to_num(np.asarray(speeds, dtype=np.float64)) * SPEED_SCALE), 0, 65535)
+    t0 = int(t[0]) if len(t) else 0
+    return b"".join([
+        PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, len(t), t0),
+        int32_deltas(lat_i, 0, "enlem").tobytes(),
+        int32_deltas(lon_i, 0, "boylam").tobytes(),
+        int32_deltas(t, t0, "zaman").tobytes(),
+        speed.astype("<u2").tobytes()
+    ])
+
+def verify_packed(payload: bytes, lats, lons, speeds, times_ms):
+    # Paketi geri açıp girdiyle karşılaştırır (hız üst sınırda kırpılır); uyuşmazsa ValueError
+    u_lats, u_lons, u_speeds, u_times = unpack_points(payload)
+    speeds = np.clip(np.nan_to_num(np.asarray(speeds, dtype=np.float64)), 0, MAX_SPEED)
+    tolerance = 0.5 / COORD_SCALE + 1e-12
+    if (
+        len(u_times) != len(times_ms)
+        or not np.array_equal(u_times, np.asarray(times_ms, dtype=np.int64))
+        or not np.allclose(u_lats, lats, rtol=0, atol=tolerance)
+        or not np.allclose(u_lons, lons, rtol=0, atol=tolerance)
+        or not np.allclose(u_speeds, speeds, rtol=0, atol=0.5 / SPEED_SCALE + 1e-9)
+    ):
+        raise ValueError("paket doğrulaması başarısız")
+
+def unpack_points(payload: bytes):
+    # (lats, lons, speeds, times_ms) numpy dizileri döner; bozuk veride ValueError
+    if len(payload) < PACKED_HEADER.size:
+        raise ValueError("başlık eksik")
+    magic, version, n, t0 = PACKED_HEADER.unpack_from(payload)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION:
+        raise ValueError("bilinmeyen format veya sürüm")
+    if n > MAX_PACKED_POINTS:
+        raise ValueError(f"en fazla {MAX_PACKED_POINTS} nokta gönderilebilir")
+    if len(payload) != PACKED_HEADER.size + n * PACKED_BYTES_PER_POINT:
+        raise ValueError("gövde uzunluğu nokta sayısıyla uyuşmuyor")
+
+    offset = PACKED_HEADER.size
+    columns = []
+    for dtype in ("<i4", "<i4", "<i4", "<u2"):
+        column = np.frombuffer(payload, dtype=dtype, count=n, offset=offset)
+        offset += column.nbytes
+        columns.append(column)
+    dlat, dlon, dt, speed = columns
+
+    lats = np.cumsum(dlat, dtype=np.int64) / COORD_SCALE
+    lons = np.cumsum(dlon, dtype=np.int64) / COORD_SCALE
+    times_ms = t0 + np.cumsum(dt, dtype=np.int64)
+    return lats, lons, speed / SPEED_SCALE, times_ms
+
+def decode_packed_points(body: bytes, content_encoding: Optional[str] = None):
+    if (content_encoding or "").lower() == "gzip" or body[:2] == b"\x1f\x8b":
+        # Sıkıştırılmış boyut da sınırlı: gzip bombasına karşı en fazla beklenen uzunluk kadar aç
+        limit = PACKED_HEADER.size + MAX_PACKED_POINTS * PACKED_BYTES_PER_POINT
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = inflater.decompress(body, limit + 1)
+        except zlib.error as e:
+            raise ValueError(f"gzip açılamadı: {e}")
+        if len(body) > limit or inflater.unconsumed_tail:
+            raise ValueError("gövde çok büyük")
+
+    lats, lons, speeds, times_ms = unpack_points(body)
+
+    # Doğrulama: nokta başına model yerine bütün dizi üzerinde aralık kontrolü
+    if len(lats) and (np.abs(lats).max() > 90 or np.abs(lons).max() > 180):
+        raise ValueError("koordinat aralık dışında")
+    now_ms = int(time.time() * 1000)
+    if len(times_ms) and (times_ms.min() < MIN_POINT_TIME_MS or times_ms.max() > now_ms + 24 * 60 * 60 * 1000):
+        raise ValueError("zaman damgası aralık dışında")
+    return lats, lons, speeds, times_ms
+
+def ms_to_datetimes(times_ms) -> List[datetime]:
+    return [datetime.fromtimestamp(ms / 1000, tz=timezone.utc) for ms in np.asarray(times_ms).tolist()]
+
+# --- KONUM KAYDI (ingest) ---
+
+COPY_INGEST_MIN_POINTS = int(os.getenv("COPY_INGEST_MIN_POINTS", "500"))
+COPY_POOL_SIZE = int(os.getenv("COPY_POOL_SIZE", "2"))
+LOCATION_COPY_COLUMNS = ["id", "latitude", "longitude", "speed", "timestamp", "tripId"]
+
+copy_pool = None
+
+def new_id() -> str:
+    # Prisma'nın cuid() varsayılanı istemci tarafında üretiliyor; ham SQL yazımlarında id'yi biz veriyoruz
+    return "c" + uuid.uuid4().hex
+
+def to_db_timestamp(ts: datetime) -> datetime:
+    # Prisma DateTime kolonları "timestamp(3) without time zone" ve UTC tutuyor
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+def asyncpg_dsn(url: str) -> str:
+    # Prisma'ya özel URL parametreleri (schema, connection_limit, ...) asyncpg'ye geçmesin
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k in ("sslmode",)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+async def init_copy_pool():
+    global copy_pool
+    url = os.getenv("DATABASE_URL")
+    if asyncpg is None or not url or COPY_INGEST_MIN_POINTS <= 0:
+        return
+    try:
+        copy_pool = await asyncpg.create_pool(dsn=asyncpg_dsn(url), min_size=1, max_size=COPY_POOL_SIZE)
+    except Exception as e:
+        copy_pool = None
+        print(f"COPY ingest pool unavailable, falling back to Prisma: {e}")
+
+async def close_copy_pool():
+    global copy_pool
+    if copy_pool is not None:
+        await copy_pool.close()
+        copy_pool = None
+
+async def copy_locations(trip_id: str, ids, lats, lons, speeds, timestamps) -> int:
+    # Binary COPY: Prisma query engine'in JSON protokolünü atlar
+    records = [
+        (point_id, lat, lon, speed, to_db_timestamp(ts), trip_id)
+        for point_id, lat, lon, speed, ts in zip(ids, lats, lons, speeds, timestamps)
+    ]
+    async with copy_pool.acquire() as conn:
+        await conn.copy_records_to_table("LocationPoint", records=records, columns=LOCATION_COPY_COLUMNS)
+    return len(records)
+
+# Paketin ilk noktası ile trip'in son kayıtlı noktası arasındaki mesafe de SQL içinde eklenir,
+# böylece ingest sırasında Trip satırını önceden okumaya gerek kalmaz.
+# Trip özeti ile birlikte sahibinin dataVersion'ı da aynı sorguda artar (ETag'ler için)
+TRIP_STATS_SQL = """
+WITH t AS (
+UPDATE "Trip" SET
+    "pointCount" = "pointCount" + $2::int,
+    "speedSum" = "speedSum" + $3::float8,
+    "maxSpeed" = GREATEST("maxSpeed", $4::float8),
+    "gpsDistanceKm" = "gpsDistanceKm" + $5::float8 + CASE WHEN "lastLatitude" IS NULL THEN 0 ELSE
+        2 * 6371.0088 * ASIN(LEAST(1, SQRT(
+            POWER(SIN(RADIANS($6::float8 - "lastLatitude") / 2), 2)
+            + COS(RADIANS("lastLatitude")) * COS(RADIANS($6::float8))
+              * POWER(SIN(RADIANS($7::float8 - "lastLongitude") / 2), 2)
+        ))) END,
+    "lastLatitude" = $8::float8,
+    "lastLongitude" = $9::float8
+WHERE "id" = $1
+RETURNING "userId"
+)
+UPDATE "User" SET "dataVersion" = "dataVersion" + 1
+WHERE id IN (SELECT "userId" FROM t)
+"""
+
+async def update_trip_stats(db, trip_id: str, lats, lons, speeds):
+    # lats/lons/speeds zaman sırasına göre dizilmiş olmalı
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    speeds = np.asarray(speeds, dtype=np.float64)
+    if not len(lats):
+        return
+    await db.execute_raw(
+        TRIP_STATS_SQL,
+        trip_id,
+        int(len(lats)),
+        float(speeds.sum()),
+        float(speeds.max()),
+        haversine_km(lats, lons),
+        float(lats[0]), float(lons[0]),
+        float(lats[-1]), float(lons[-1])
+    )
+
+async def store_locations(db, trip_id: str, lats, lons, speeds, timestamps, ids=None) -> int:
+    # Noktaları zaman sırasına dizip tek seferde yazar (büyük paketlerde COPY, diğerlerinde create_many),
+    # ardından Trip özetini günceller. id'ler verilmezse burada üretilir.
+    if ids is None:
+        ids = [new_id() for _ in timestamps]
+    order = np.argsort([t.timestamp() for t in timestamps], kind="stable")
+    lats = np.asarray(lats, dtype=np.float64)[order]
+    lons = np.asarray(lons, dtype=np.float64)[order]
+    speeds = np.nan_to_num(np.asarray(speeds, dtype=np.float64)[order])
+    timestamps = [timestamps[i] for i in order]
+    ids = [ids[i] for i in order]
+
+    count = None
+    if copy_pool is not None and len(lats) >= COPY_INGEST_MIN_POINTS:
+        try:
+            count = await copy_locations(trip_id, ids, lats.tolist(), lons.tolist(), speeds.tolist(), timestamps)
+        except Exception as e:
+            # COPY tek işlemde çalışır; hata olursa hiçbir satır yazılmamıştır
+            print(f"COPY INGEST ERROR, falling back to create_many: {e}")
+
+    if count is None:
+        count = await db.locationpoint.create_many(
+            data=[
+                {
+                    "id": point_id,
+                    "tripId": trip_id,
+                    "latitude": lat,
+                    "longitude": lon,
+                    "speed": speed,
+                    "timestamp": ts
+                }
+                for point_id, lat, lon, speed, ts in zip(ids, lats.tolist(), lons.tolist(), speeds.tolist(), timestamps)
+            ]
+        )
+    await update_trip_stats(db, trip_id, lats, lons, speeds)
+    return count
+
+# --- SOĞUK YOLCULUK SIKIŞTIRMA ---
+
+TRIP_COMPACT_AFTER_HOURS = float(os.getenv("TRIP_COMPACT_AFTER_HOURS", "72"))
+TRIP_COMPACTION_INTERVAL_MINUTES = float(os.getenv("TRIP_COMPACTION_INTERVAL_MINUTES", "0"))
+TRIP_COMPACTION_BATCH = int(os.getenv("TRIP_COMPACTION_BATCH", "50"))
+COMPACTION_TX_TIMEOUT = timedelta(seconds=60)
+
+def points_to_columns(points):
+    return (
+        np.array([p.latitude for p in points], dtype=np.float64),
+        np.array([p.longitude for p in points], dtype=np.float64),
+        np.array([p.speed or 0 for p in points], dtype=np.float64),
+        np.array([int(p.timestamp.timestamp() * 1000) for p in points], dtype=np.int64)
+    )
+
+def merge_columns(a, b):
+    if not len(b[0]):
+        return a
+    merged = [np.concatenate([x, y]) for x, y in zip(a, b)]
+    order = np.argsort(merged[3], kind="stable")
+    return tuple(column[order] for column in merged)
+
+def decode_trip_path(path):
+    return unpack_points(zlib.decompress(path.data.decode()))
+
+async def load_trip_columns(db, trip_id: str, path=_MISSING):
+    # Noktaları hangi biçimde durursa dursun (blob + sonradan gelmiş satırlar) zaman sırasıyla döner
+    if path is _MISSING:
+        path = await db.trippath.find_unique(where={"tripId": trip_id})
+    points = await db.locationpoint.find_many(
+        where={"tripId": trip_id},
+        order=[{"timestamp": "asc"}, {"id": "asc"}]
+    )
+    columns = points_to_columns(points)
+    return merge_columns(decode_trip_path(path), columns) if path else columns
+
+# Satırlar okunup aynı ifadede silinir; okuma ile silme arasında gelen (offline)
+# noktalar silinmez, bir sonraki sıkıştırmada blob'a eklenir
+COMPACT_ROWS_SQL = """
+DELETE FROM "LocationPoint"
+WHERE "tripId" = $1
+RETURNING latitude, longitude, COALESCE(speed, 0) AS speed,
+    (EXTRACT(EPOCH FROM "timestamp") * 1000)::bigint AS t_ms
+"""
+
+async def compact_trip(db, trip_id: str) -> int:
+    # Satırları tek blob'a taşır. Daha önce sıkıştırılmışsa sonradan gelen satırlar blob'a eklenir.
+    async with db.tx(timeout=COMPACTION_TX_TIMEOUT) as transaction:
+        # Aynı yolculuğu sıkıştıran iki işlem birbirinin blob'unu ezmesin
+        locked = await transaction.query_raw('SELECT id FROM "Trip" WHERE id = $1 FOR UPDATE', trip_id)
+        if not locked:
+            return 0
+        rows = await transaction.query_raw(COMPACT_ROWS_SQL, trip_id)
+        if not rows:
+            return 0
+        path = await transaction.trippath.find_unique(where={"tripId": trip_id})
+        columns = merge_columns(
+            decode_trip_path(path) if path else points_to_columns([]),
+            (
+                np.array([r["latitude"] for r in rows], dtype=np.float64),
+                np.array([r["longitude"] for r in rows], dtype=np.float64),
+                np.array([r["speed"] for r in rows], dtype=np.float64),
+                np.array([int(r["t_ms"]) for r in rows], dtype=np.int64)
+            )
+        )
+        # Kaynak satırlar bu işlemde silindi: blob doğrulanamazsa hata fırlatılır ve
+        # işlem geri alınır, satırlar yerinde kalır
+        packed = pack_points(*columns)
+        verify_packed(packed, *columns)
+        blob = Base64.encode(zlib.compress(packed, 6))
+        count = len(columns[0])
+        await transaction.trippath.upsert(
+            where={"tripId": trip_id},
+            data={
+                "create": {"tripId": trip_id, "pointCount": count, "data": blob},
+                "update": {"pointCount": count, "data": blob}
+            }
+        )
+    return len(rows)
+
+async def expand_trip(db, trip_id: str) -> int:
+    # compact_trip'in tersi: blob'u tekrar LocationPoint satırlarına açar
+    path = await db.trippath.find_unique(where={"tripId": trip_id})
+    if not path:
+        return 0
+    lats, lons, speeds, times_ms = decode_trip_path(path)
+    timestamps = ms_to_datetimes(times_ms)
+    async with db.tx(timeout=COMPACTION_TX_TIMEOUT) as transaction:
+        await transaction.locationpoint.create_many(
+            data=[
+                {"tripId": trip_id, "latitude": lat, "longitude": lon, "speed": speed, "timestamp": ts}
+                for lat, lon, speed, ts in zip(lats.tolist(), lons.tolist(), speeds.tolist(), timestamps)
+            ]
+        )
+        await transaction.trippath.delete(where={"tripId": trip_id})
+    return len(timestamps)
+
+async def compact_cold_trips(db, older_than_hours: float = TRIP_COMPACT_AFTER_HOURS, limit: int = TRIP_COMPACTION_BATCH, cursor=None):
+    # Satırı olan (hiç sıkıştırılmamış ya da sonradan nokta gelmiş) soğuk yolculuklar.
+    # (endTime, id) üzerinden ilerler; hata veren yolculuk sonraki partileri tıkamaz.
+    # (sıkıştırılan nokta sayısı, sonraki imleç) döner; imleç None ise liste bitti.
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=older_than_hours)
+    where = {"isActive": False, "endTime": {"lt": cutoff}, "locations": {"some": {}}}
+    if cursor:
+        last_end, last_id = cursor
+        where["OR"] = [
+            {"endTime": {"gt": last_end}},
+            {"endTime": {"equals": last_end}, "id": {"gt": last_id}}
+        ]
+    trips = await db.trip.find_many(
+        where=where,
+        order=[{"endTime": "asc"}, {"id": "asc"}],
+        take=limit
+    )
+    compacted = 0
+    for trip in trips:
+        try:
+            compacted += await compact_trip(db, trip.id)
+        except Exception as e:
+            print(f"TRIP COMPACTION ERROR ({trip.id}): {e}")
+    if trips:
+        print(f"Compacted {len(trips)} trips ({compacted} points)")
+    next_cursor = (trips[-1].endTime, trips[-1].id) if len(trips) == limit else None
+    return compacted, next_cursor
+
+compaction_task = None
+
+async def compaction_loop():
+    # Her turda bir parti; imleç turlar arasında korunur, liste bitince baştan başlar
+    cursor = None
+    while True:
+        await asyncio.sleep(TRIP_COMPACTION_INTERVAL_MINUTES * 60)
+        try:
+            _, cursor = await compact_cold_trips(prisma, cursor=cursor)
+        except Exception as e:
+            cursor = None
+            print(f"TRIP COMPACTION ERROR: {e}")
+
+# --- YOLCULUK SONU ANALİZİ ---
+
+MOVING_SPEED_KMH = 3.0
+HARSH_ACCEL_MS2 = 3.0
+HARSH_BRAKE_MS2 = -3.5
+MAX_SAMPLE_GAP_SECONDS = 60  # Daha uzun boşluklar (sinyal kaybı) süreye/ivmeye katılmaz
+SPEED_HISTOGRAM_EDGES = [0, 20, 40, 60, 80, 100, 120, 140]
+
+def count_events(mask) -> int:
+    # Arka arkaya eşiği aşan örnekler tek olay sayılır
+    if not len(mask):
+        return 0
+    return int((mask & ~np.concatenate([[False], mask[:-1]])).sum())
+
+def trip_analytics(lats, lons, speeds, times_ms) -> dict:
+    labels = [f"{a}-{b}" for a, b in zip(SPEED_HISTOGRAM_EDGES, SPEED_HISTOGRAM_EDGES[1:])]
+    labels.append(f"{SPEED_HISTOGRAM_EDGES[-1]}+")
+    result = {
+        "gpsDistanceKm": haversine_km(lats, lons),
+        "movingSeconds": 0,
+        "idleSeconds": 0,
+        "harshAccelCount": 0,
+        "harshBrakeCount": 0,
+        "speedHistogram": {label: 0 for label in labels}
+    }
+    if len(times_ms) < 2:
+        return result
+
+    dt = np.diff(times_ms) / 1000
+    valid = (dt > 0) & (dt <= MAX_SAMPLE_GAP_SECONDS)
+    seg_speed = speeds[:-1]
+    moving = valid & (seg_speed >= MOVING_SPEED_KMH)
+    result["movingSeconds"] = int(round(dt[moving].sum()))
+    result["idleSeconds"] = int(round(dt[valid & ~moving].sum()))
+
+    # km/h farkı -> m/s²
+    accel = np.zeros_like(dt)
+    accel[valid] = np.diff(speeds)[valid] / 3.6 / dt[valid]
+    result["harshAccelCount"] = count_events(accel >= HARSH_ACCEL_MS2)
+    result["harshBrakeCount"] = count_events(accel <= HARSH_BRAKE_MS2)
+
+    # Her hız aralığında geçen süre (sn)
+    seconds, _ = np.histogram(
+        seg_speed[valid], bins=SPEED_HISTOGRAM_EDGES + [np.inf], weights=dt[valid]
+    )
+    result["speedHistogram"] = {label: int(round(v)) for label, v in zip(labels, seconds)}
+    return result
+
+async def analyze_trip(db, trip_id: str):
+    columns = await load_trip_columns(db, trip_id)
+    metrics = trip_analytics(*columns)
+    metrics["speedHistogram"] = Json(metrics["speedHistogram"])
+    trip = await db.trip.update(
+        where={"id": trip_id},
+        data={**metrics, "analyzedAt": datetime.now(timezone.utc)}
+    )
+    await bump_data_version(db, trip.userId)
+
+async def analyze_trip_safe(trip_id: str):
+    # end_trip cevabı gönderildikten sonra çalışır (BackgroundTasks)
+    try:
+        await analyze_trip(prisma, trip_id)
+    except Exception as e:
+        print(f"TRIP ANALYTICS ERROR ({trip_id}): {e}")
+        traceback.print_exc()
+
+# --- TRIP SAHİPLİK ÖNBELLEĞİ ---
+
+class TripState(NamedTuple):
+    userId: str
+    isActive: bool
+    startTime: Optional[datetime]
+
+# trip_id -> TripState. Konum ingest'i her istekte trip.find_unique yapmasın diye.
+trip_cache = TTLCache(
+    maxsize=int(os.getenv("TRIP_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TRIP_CACHE_TTL", str(6 * 60 * 60)))
+)
+
+def cache_trip(trip) -> TripState:
+    state = TripState(trip.userId, trip.isActive, trip.startTime)
+    trip_cache.set(trip.id, state)
+    return state
+
+async def get_owned_trip(db, trip_id: str, user_id: str) -> TripState:
+    state = trip_cache.get(trip_id)
+    if state is None:
+        trip = await db.trip.find_unique(where={"id": trip_id})
+        if not trip:
+            raise HTTPException(status_code=404, detail="Yolculuk bulunamadı.")
+        state = cache_trip(trip)
+    # Başkasının yolculuğu da "bulunamadı" döner (full-path ile aynı davranış)
+    if state.userId != user_id:
+        raise HTTPException(status_code=404, detail="Yolculuk bulunamadı.")
+    return state
+
+# --- KULLANICI BAĞLAMI ---
+
+# token -> user_id. Geçerli token'lar için HMAC doğrulaması tekrar yapılmaz;
+# kayıt token'ın süresi dolmadan düşer.
+token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", str(15 * 60)))
+)
+
+async def load_first_vehicle(db, user_id: str):
+    # defaultVehicleId boşsa (henüz backfill edilmemiş ya da araç silinince SetNull)
+    # eskisi gibi kullanıcının ilk eklenen aracına düşülür
+    return await db.vehicle.find_first(where={"userId": user_id}, order={"createdAt": "asc"})
+
+async def load_default_vehicle(db, user_id: str):
+    # Süreç içi önbellek tutulmaz: varsayılan araç başka bir worker'da değişmiş olabilir
+    user = await db.user.find_unique(where={"id": user_id}, include={"defaultVehicle": True})
+    if user and user.defaultVehicle:
+        return user.defaultVehicle
+    return await load_first_vehicle(db, user_id)
+
+# Tek sorguda bul-veya-oluştur. Aynı cihazdan eşzamanlı girişler unique hatasına
+# düşmez; çakışmada boş olmayan bir DO UPDATE ile mevcut satır RETURNING'e girer.
+DEVICE_LOGIN_SQL = """
+INSERT INTO "User" (id, "deviceId", name)
+VALUES ($1, $2, 'Sürücü')
+ON CONFLICT ("deviceId") DO UPDATE SET "deviceId" = EXCLUDED."deviceId"
+RETURNING id, name, "isLifetimePro", "defaultVehicleId", (xmax = 0) AS created
+"""
+
+async def login_device(db, device_id: str) -> dict:
+    rows = await db.query_raw(DEVICE_LOGIN_SQL, new_id(), device_id)
+    return rows[0]
+
 async def get_current_user(token: str = Header(None, alias="Authorization")):
     if not token or not token.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Yetkisiz erişim: Token bulunamadı.")
     
     actual_token = token.split(" ")[1]
+    user_id = token_cache.get(actual_token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(actual_token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(status_code=401, detail="Geçersiz token.")
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(actual_token, user_id, ttl=min(token_cache.ttl, remaining))
         return user_id
     except JWTError:
         raise HTTPException(status_code=401, detail="Oturum süresi dolmuş veya geçersiz.")
 
+# --- KONUM YAZMA TAMPONU (write-behind) ---
+
+LOCATION_BUFFER_ENABLED = os.getenv("LOCATION_BUFFER_ENABLED", "1") == "1"
+LOCATION_BUFFER_FLUSH_POINTS = int(os.getenv("LOCATION_BUFFER_FLUSH_POINTS", "50"))
+LOCATION_BUFFER_FLUSH_MS = int(os.getenv("LOCATION_BUFFER_FLUSH_MS", "2000"))
+LOCATION_BUFFER_MAX_POINTS = int(os.getenv("LOCATION_BUFFER_MAX_POINTS", "20000"))
+
+class LocationWriteBuffer:
+    # Tekli konum isteklerini bellekte biriktirip trip başına create_many ile yazar.
+    # Bir trip'te flush_points nokta birikince ya da ilk noktası flush_ms'i geçince yazılır.
+    # Toplam max_points dolunca yeni noktalar yer açılana kadar bekler (backpressure).
+    # Aynı trip'in yazmaları sırayla yapılır; flush_trip sürmekte olan yazmayı da bekler.
+
+    def __init__(self, flush_points: int, flush_ms: int, max_points: int):
+        self.flush_points = flush_points
+        self.flush_seconds = flush_ms / 1000
+        self.max_points = max_points
+        self.pending = {}
+        self.first_at = {}
+        self.size = 0
+        self.flushed = 0
+        self.failed = 0
+        self._cond = asyncio.Condition()
+        self._stopping = asyncio.Event()
+        self._loop_task = None
+        self._flush_tasks = set()
+        self._trip_locks = {}  # trip_id -> [asyncio.Lock, bekleyen sayısı]
+
+    async def add(self, trip_id: str, point_id: str, latitude: float, longitude: float, speed: float, timestamp: datetime):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.size < self.max_points)
+            points = self.pending.setdefault(trip_id, [])
+            points.append((point_id, latitude, longitude, speed, timestamp))
+            self.first_at.setdefault(trip_id, time.monotonic())
+            self.size += 1
+            full = len(points) >= self.flush_points
+        if full:
+            task = asyncio.create_task(self.flush_trip(trip_id))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush_trip(self, trip_id: str):
+        # Döndüğünde bu trip için o ana kadar alınmış bütün noktalar yazılmış olur
+        # (başka bir görevin pending'den almış olduğu parti dahil)
+        entry = self._trip_locks.setdefault(trip_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._write_trip(trip_id)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._trip_locks.pop(trip_id, None)
+
+    async def _write_trip(self, trip_id: str):
+        async with self._cond:
+            points = self.pending.pop(trip_id, None)
+            self.first_at.pop(trip_id, None)
+        if not points:
+            return
+        try:
+            ids, lats, lons, speeds, timestamps = zip(*points)
+            await store_locations(prisma, trip_id, lats, lons, speeds, list(timestamps), list(ids))
+            self.flushed += len(points)
+        except Exception as e:
+            self.failed += len(points)
+            print(f"LOCATION BUFFER FLUSH ERROR ({trip_id}, {len(points)} nokta): {e}")
+            traceback.print_exc()
+            return
+        finally:
+            async with self._cond:
+                self.size -= len(points)
+                self._cond.notify_all()
+        # Yazma bitmiş bir yolculuğa düştüyse (end_trip'in özeti bu noktalardan önce
+        # hesaplanmış olabilir) günlük özet yeniden hesaplanır. Kontrol yazmadan sonra
+        # yapıldığı için end_trip ile yarışta da özetlerden biri bu noktaları görür.
+        try:
+            trip = await prisma.trip.find_unique(where={"id": trip_id})
+        except Exception as e:
+            print(f"LOCATION BUFFER TRIP CHECK ERROR ({trip_id}): {e}")
+            return
+        if trip and not trip.isActive:
+            await refresh_daily_stats_safe(prisma, trip.userId, trip.startTime)
+
+    async def discard(self, trip_id: str):
+        async with self._cond:
+            points = self.pending.pop(trip_id, None)
+            self.first_at.pop(trip_id, None)
+            if points:
+                self.size -= len(points)
+                self._cond.notify_all()
+
+    async def flush_all(self):
+        await asyncio.gather(*(self.flush_trip(t) for t in list(self.pending)))
+
+    async def _run(self):
+        # İptal edilmez: close() _stopping'i işaretler, döngü sürmekte olan yazmaları bitirip çıkar.
+        # Böylece pending'den alınmış noktalar yazılmadan kaybolmaz.
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_seconds / 4)
+                break
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            due = [t for t, first in list(self.first_at.items()) if now - first >= self.flush_seconds]
+            if due:
+                await asyncio.gather(*(self.flush_trip(t) for t in due))
+
+    def start(self):
+        if self._loop_task is None:
+            self._stopping.clear()
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._loop_task is not None:
+            self._stopping.set()
+            await self._loop_task
+            self._loop_task = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush_all()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.size,
+            "trips": len(self.pending),
+            "maxsize": self.max_points,
+            "flushed": self.flushed,
+            "failed": self.failed
+        }
+
+location_buffer = LocationWriteBuffer(
+    LOCATION_BUFFER_FLUSH_POINTS, LOCATION_BUFFER_FLUSH_MS, LOCATION_BUFFER_MAX_POINTS
+)
+
+# --- GÜNLÜK ÖZET (UserDailyStats) ---
+
+DAILY_STATS_TX_TIMEOUT = timedelta(seconds=15)
+# (kullanıcı, gün) başına işlem süreli kilit: aynı günü yeniden hesaplayan iki istek
+# sırayla okur/yazar, eski okumanın sonucu yenisinin üstüne yazılmaz
+DAILY_STATS_LOCK_SQL = 'SELECT 1 AS locked FROM pg_advisory_xact_lock(hashtext($1), $2::int)'
+
+def utc_day_start(dt: datetime) -> datetime:
+    dt = dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def refresh_daily_stats(db, user_id: str, day: datetime):
+    # Tek bir günün özetini o günün yolculuk ve yakıt kayıtlarından yeniden hesaplar (upsert)
+    day = utc_day_start(day)
+    next_day = day + timedelta(days=1)
+
+    async with db.tx(timeout=DAILY_STATS_TX_TIMEOUT) as transaction:
+        await transaction.query_raw(DAILY_STATS_LOCK_SQL, user_id, day.toordinal())
+        await write_daily_stats(transaction, user_id, day, next_day)
+
+async def write_daily_stats(db, user_id: str, day: datetime, next_day: datetime):
+    trips = await db.trip.find_many(
+        where={"userId": user_id, "isActive": False, "startTime": {"gte": day, "lt": next_day}}
+    )
+    fuels = await db.fuellog.find_many(
+        where={"userId": user_id, "date": {"gte": day, "lt": next_day}}
+    )
+
+    stats = {
+        "totalKm": sum(t.distanceKm or 0 for t in trips),
+        "totalSpend": sum(f.totalPrice for f in fuels),
+        "tripCount": len(trips),
+        "maxSpeed": max((t.maxSpeed or 0 for t in trips if t.pointCount), default=0),
+        "speedAvgSum": 0.0,
+        "speedAvgCount": 0
+    }
+    for t in trips:
+        if t.pointCount and t.speedSum:
+            stats["speedAvgSum"] += t.speedSum / t.pointCount
+            stats["speedAvgCount"] += 1
+
+    await db.userdailystats.upsert(
+        where={"userId_day": {"userId": user_id, "day": day}},
+        data={
+            "create": {"userId": user_id, "day": day, **stats},
+            "update": stats
+        }
+    )
+
+async def refresh_daily_stats_safe(db, user_id: str, day: Optional[datetime]):
+    # Asıl yazma işlemi tamamlandıktan sonra çağrılır; özet hatası isteği düşürmesin
+    if not day:
+        return
+    try:
+        await refresh_daily_stats(db, user_id, day)
+    except Exception as e:
+        print(f"DAILY STATS REFRESH ERROR: {e}")
+        traceback.print_exc()
+
+def daily_stats_window(period: str, now: datetime):
+    # (period, dönem başlangıcı, dilim sayısı); bilinmeyen period haftalık sayılır
+    if period == "yearly":
+        start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        return period, start_date, 12
+    if period == "monthly":
+        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return period, start_date, 4
+    start_date = now - timedelta(days=now.weekday())
+    start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return "weekly", start_date, 7
+
+def daily_stats_cache_period(period: str, start_date: datetime) -> str:
+    # Dönem başlangıcı anahtara girer; yeni hafta/ay başlayınca eski kayıt kullanılmaz
+    return f"{period}:{start_date.date().isoformat()}"
+
+async def compute_daily_stats(db, user_id: str, period: str, start_date: datetime, segments: int) -> list:
+    # Günlük özet tablosundan en fazla 366 satır
+    rows = await db.userdailystats.find_many(
+        where={"userId": user_id, "day": {"gte": start_date}}
+    )
+
+    buckets = [
+        {"km": 0.0, "spend": 0.0, "trips": 0, "max_speed": 0.0, "avg_sum": 0.0, "avg_count": 0}
+        for _ in range(segments)
+    ]
+    for r in rows:
+        day = utc_day_start(r.day)
+        if period == "yearly":
+            if day.year != start_date.year:
+                continue
+            i = day.month - 1
+        elif period == "monthly":
+            if (day.year, day.month) != (start_date.year, start_date.month):
+                continue
+            i = min((day - start_date).days // 7, 3)
+        else:
+            i = (day - start_date).days
+            if i >= segments:
+                continue
+
+        b = buckets[i]
+        b["km"] += r.totalKm
+        b["spend"] += r.totalSpend
+        b["trips"] += r.tripCount
+        b["max_speed"] = max(b["max_speed"], r.maxSpeed)
+        b["avg_sum"] += r.speedAvgSum
+        b["avg_count"] += r.speedAvgCount
+
+    daily_stats = []
+    for i, b in enumerate(buckets):
+        day_avg_speed = b["avg_sum"] / b["avg_count"] if b["avg_count"] else 0
+        daily_stats.append({
+            "day_index": i,
+            "total_km": round(b["km"], 2),
+            "total_spend": round(b["spend"], 2),
+            "trip_count": b["trips"],
+            "max_speed": round(b["max_speed"], 1),
+            "avg_speed": round(day_avg_speed, 1)
+        })
+
+    return daily_stats
+
+# --- OKUMA REPLİKASI YÖNLENDİRME ---
+
+# READ_DATABASE_URL verilirse dashboard/geçmiş okumaları ikinci (salt okunur) bir
+# Prisma istemcisine gider. Kendi verisini yeni yazmış kullanıcı, replika gecikmesini
+# görmesin diye READ_YOUR_WRITES_SECONDS boyunca birincil veritabanından okur.
+# Son yazma bilgisi süreç içidir; yazma başka bir worker'da olduysa kullanıcının
+# dataVersion'ı replikada ve birincilde (birer PK sorgusu) karşılaştırılır, replika
+# gerideyse okuma birincile gider. Okunan satır not_modified'a verilir, ETag için
+# ayrıca sorgu atılmaz.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Sürüm kontrolü art arda bu kadar kez hata verir/zaman aşımına uğrarsa replika
+# READ_REPLICA_RETRY_SECONDS boyunca devre dışı kalır
+READ_REPLICA_MAX_FAILURES = int(os.getenv("READ_REPLICA_MAX_FAILURES", "3"))
+READ_REPLICA_RETRY_SECONDS = float(os.getenv("READ_REPLICA_RETRY_SECONDS", "30"))
+
+read_prisma = make_prisma(READ_DATABASE_URL) if READ_DATABASE_URL else None
+# Replikaya bağlanılamazsa okumalar birincilde kalır
+read_db_available = False
+read_db_failures = 0
+read_db_retry_at = None
+
+# user_id -> True; TTL dolana kadar o kullanıcının okumaları birincile gider
+recent_writers = TTLCache(
+    maxsize=int(os.getenv("RECENT_WRITERS_SIZE", "50000")),
+    ttl=READ_YOUR_WRITES_SECONDS
+)
+
+def mark_user_write(user_id: str):
+    if read_prisma is not None:
+        recent_writers.set(user_id, True)
+
+def read_db_check_failed(e: Exception):
+    global read_db_available, read_db_failures, read_db_retry_at
+    read_db_failures += 1
+    print(f"READ REPLICA CHECK ERROR ({read_db_failures}): {e!r}")
+    if read_db_available and read_db_failures >= READ_REPLICA_MAX_FAILURES:
+        read_db_available = False
+        read_db_retry_at = time.monotonic() + READ_REPLICA_RETRY_SECONDS
+        print(f"READ REPLICA disabled for {READ_REPLICA_RETRY_SECONDS:.0f}s, reads stay on primary")
+
+async def get_read_db(user_id: str):
+    # (db, sürüm satırı) döner; satır yoksa (None) not_modified sürümü kendisi okur
+    global read_db_available, read_db_failures, read_db_retry_at
+    if read_prisma is None:
+        return prisma, None
+    if not read_db_available:
+        # Hata yüzünden kapatılmış replika, bekleme bitince tek bir kontrolle yeniden denenir
+        if read_db_retry_at is None or time.monotonic() < read_db_retry_at:
+            return prisma, None
+        read_db_available = True
+        read_db_failures = READ_REPLICA_MAX_FAILURES - 1
+        read_db_retry_at = None
+    if recent_writers.get(user_id):
+        return prisma, None
+    try:
+        primary_rows, replica_rows = await asyncio.wait_for(
+            asyncio.gather(
+                prisma.query_raw(USER_VERSION_SQL, user_id),
+                read_prisma.query_raw(USER_VERSION_SQL, user_id)
+            ),
+            timeout=READY_QUERY_TIMEOUT
+        )
+    except Exception as e:
+        read_db_check_failed(e)
+        return prisma, None
+    read_db_failures = 0
+    # Kullanıcı replikada henüz yoksa ya da sürümü gerideyse birincilden okunur
+    if primary_rows and (not replica_rows or replica_rows[0]["dataVersion"] < primary_rows[0]["dataVersion"]):
+        return prisma, primary_rows[0]
+    return read_prisma, replica_rows[0] if replica_rows else None
+
+async def connect_read_db():
+    global read_db_available
+    if read_prisma is None:
+        return
+    try:
+        await connect_prisma(read_prisma)
+        await read_prisma.query_raw("SELECT 1")
+        read_db_available = True
+    except Exception as e:
+        print(f"READ REPLICA unavailable, reads stay on primary: {e}")
+
+async def disconnect_read_db():
+    global read_db_available, read_db_retry_at
+    read_db_available = False
+    read_db_retry_at = None
+    if read_prisma is not None and read_prisma.is_connected():
+        await read_prisma.disconnect()
+
+# --- VERİ SÜRÜMÜ (ETag / 304) ---
+
+# User.dataVersion her yazma işleminde artar. Okuma endpoint'leri ETag'i bundan
+# üretir; If-None-Match eşleşirse sorgu çalışmadan 304 döner.
+
+async def bump_data_version(db, user_id: str) -> int:
+    # Yeni sürümü döner (yanıt önbelleğinden eski sürümün anahtarını silmek için)
+    mark_user_write(user_id)
+    rows = await db.query_raw(
+        'UPDATE "User" SET "dataVersion" = "dataVersion" + 1 WHERE id = $1 RETURNING "dataVersion"', user_id
+    )
+    return rows[0]["dataVersion"] if rows else 0
+
+# Sürümle birlikte varsayılan araç da okunur; /vehicles isDefault'u ETag ile aynı anlık görüntüden türetir
+USER_VERSION_SQL = 'SELECT "dataVersion", "defaultVehicleId" FROM "User" WHERE id = $1'
+
+def make_etag(request: Request, user_id: str, version: int) -> str:
+    scope = f"{user_id}|{request.url.path}?{request.url.query}"
+    return f'W/"{version}-{zlib.crc32(scope.encode()):08x}"'
+
+class VersionCheck(NamedTuple):
+    response: Optional[Response]  # If-None-Match eşleştiyse 304 cevabı
+    version: int
+    defaultVehicleId: Optional[str] = None
+
+async def not_modified(db, request: Request, response: Response, user_id: str, version_row: Optional[dict] = None) -> VersionCheck:
+    # Sürüm aggregation'dan önce okunur; arada bir yazma olursa ETag eski kalır ve
+    # bir sonraki istekte tam cevap döner (yanlışlıkla 304 verilmez).
+    # version_row, get_read_db'nin aynı db'den okuduğu satırdır (tekrar sorgulanmaz)
+    if version_row is None:
+        rows = await db.query_raw(USER_VERSION_SQL, user_id)
+        version_row = rows[0] if rows else None
+    version = version_row["dataVersion"] if version_row else 0
+    default_vehicle_id = version_row["defaultVehicleId"] if version_row else None
+    etag = make_etag(request, user_id, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {t.strip() for t in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return VersionCheck(Response(status_code=304, headers=headers), version, default_vehicle_id)
+    response.headers.update(headers)
+    return VersionCheck(None, version, default_vehicle_id)
+
+# --- YANIT ÖNBELLEĞİ (dashboard) ---
+
+# Hesaplanmış dashboard cevapları JSON bayt olarak (user, endpoint, period, dataVersion)
+# anahtarıyla saklanır. Her yazma sürümü artırdığı için eski gövde yeni ETag ile asla
+# dönmez (başka worker'daki yazmalar ve geç biten okumalar dahil). Yazma endpoint'lerinin
+# eski sürümü silmesi sadece bellek temizliğidir; kalanları LRU/TTL düşürür.
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+SUMMARY_ENDPOINT = "summary"
+DAILY_STATS_ENDPOINT = "daily-stats"
+
+def response_cache_periods(endpoint: str) -> List[str]:
+    # Bir endpoint'in şu an geçerli olabilecek tüm period anahtarları
+    if endpoint == DAILY_STATS_ENDPOINT:
+        now = datetime.now(timezone.utc)
+        return [
+            daily_stats_cache_period(*daily_stats_window(p, now)[:2])
+            for p in ("weekly", "monthly", "yearly")
+        ]
+    return ["all"]
+
+def response_cache_key(user_id: str, endpoint: str, period: str, version: int) -> str:
+    return f"{user_id}:{endpoint}:{period}:{version}"
+
+class MemoryResponseCache:
+    # Varsayılan backend: süreç içi LRU (TTLCache)
+
+    backend = "memory"
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, body: bytes):
+        self._cache.set(key, body)
+
+    async def delete(self, keys: List[str]):
+        for key in keys:
+            self._cache.pop(key)
+
+    async def close(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        # Bellek kullanımı: saklanan JSON gövdelerinin toplam boyutu
+        stored = sum(len(body) for _, body in self._cache._data.values())
+        return {"backend": self.backend, **self._cache.stats(), "bytes": stored}
+
+class RedisResponseCache:
+    # Opsiyonel harici backend. İstemci dışarıdan verilir; testlerde yerel bir
+    # taklit (ör. fakeredis.aioredis.FakeRedis) kullanılabilir.
+
+    backend = "redis"
+
+    def __init__(self, client, ttl: float, prefix: str = "otolog:resp:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.bytes_written = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            body = await self.client.get(self.prefix + key)
+        except Exception as e:
+            # Önbellek hatası isteği düşürmesin; ıska say
+            self.errors += 1
+            print(f"RESPONSE CACHE ERROR: {e}")
+            body = None
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    async def set(self, key: str, body: bytes):
+        try:
+            await self.client.set(self.prefix + key, body, px=int(self.ttl * 1000))
+            self.bytes_written += len(body)
+        except Exception as e:
+            self.errors += 1
+            print(f"RESPONSE CACHE ERROR: {e}")
+
+    async def delete(self, keys: List[str]):
+        if not keys:
+            return
+        try:
+            await self.client.delete(*[self.prefix + k for k in keys])
+        except Exception as e:
+            self.errors += 1
+            print(f"RESPONSE CACHE ERROR: {e}")
+
+    async def close(self):
+        await self.client.close()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0,
+            "errors": self.errors,
+            "bytes_written": self.bytes_written
+        }
+
+if RESPONSE_CACHE_URL and aioredis is not None:
+    response_cache = RedisResponseCache(aioredis.from_url(RESPONSE_CACHE_URL), RESPONSE_CACHE_TTL)
+else:
+    if RESPONSE_CACHE_URL:
+        print("RESPONSE_CACHE_URL ayarlı ama redis paketi yok; bellek içi önbellek kullanılıyor.")
+    response_cache = MemoryResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+async def invalidate_responses(user_id: str, new_version: int, *endpoints: str):
+    # Yazmadan önceki sürümün girdileri artık okunamaz; yer kaplamasınlar
+    keys = [
+        response_cache_key(user_id, endpoint, period, new_version - 1)
+        for endpoint in endpoints
+        for period in response_cache_periods(endpoint)
+    ]
+    await response_cache.delete(keys)
+
+def cached_json_response(body: bytes, response: Response) -> Response:
+    return Response(content=body, media_type="application/json", headers=passthrough_headers(response))
+
+async def cached_payload(user_id: str, endpoint: str, period: str, version: int, response: Response, compute) -> Response:
+    # version, ETag'in üretildiği (not_modified) sürümdür; gövde ile ETag hep aynı sürümden gelir
+    key = response_cache_key(user_id, endpoint, period, version)
+    body = await response_cache.get(key)
+    if body is None:
+        body = FastJSONResponse(await compute()).body
+        await response_cache.set(key, body)
+    return cached_json_response(body, response)
+
+# --- DASHBOARD ÖZETİ ---
+
+# Bütün satırları Python'a çekmek yerine toplamlar tek sorguda hesaplanır.
+# İlk yakıt alımı (en düşük km) tüketim hesabına katılmaz: rn > 1 filtresi.
+SUMMARY_SQL = """
+WITH t AS (
+    SELECT
+        COUNT(*)::int AS trip_count,
+        COALESCE(SUM("distanceKm"), 0)::float8 AS trip_km,
+        COALESCE(MAX("maxSpeed") FILTER (WHERE "pointCount" > 0), 0)::float8 AS max_speed,
+        COALESCE(AVG("speedSum" / "pointCount") FILTER (WHERE "pointCount" > 0 AND "speedSum" > 0), 0)::float8 AS avg_speed
+    FROM "Trip"
+    WHERE "userId" = $1 AND "isActive" = false
+),
+f AS (
+    SELECT
+        COUNT(*)::int AS fuel_count,
+        COALESCE(SUM("totalPrice"), 0)::float8 AS total_spend,
+        COALESCE(SUM("liters"), 0)::float8 AS total_liters,
+        COALESCE(SUM("liters") FILTER (WHERE rn > 1), 0)::float8 AS used_liters,
+        COALESCE(MIN("currentKm"), 0)::float8 AS min_km,
+        COALESCE(MAX("currentKm"), 0)::float8 AS max_km
+    FROM (
+        SELECT "liters", "totalPrice", "currentKm", ROW_NUMBER() OVER (ORDER BY "currentKm" ASC) AS rn
+        FROM "FuelLog"
+        WHERE "userId" = $1
+    ) x
+)
+SELECT * FROM t CROSS JOIN f
+"""
+
+async def compute_summary(db, user_id: str, default_vehicle_id: Optional[str]) -> dict:
+    # default_vehicle_id, ETag sürümüyle aynı sorgudan gelir (VersionCheck.defaultVehicleId)
+    rows = await db.query_raw(SUMMARY_SQL, user_id)
+    r = rows[0]
+
+    # Odometer differences from fuel logs
+    odo_distance = r["max_km"] - r["min_km"] if r["fuel_count"] >= 2 else 0
+
+    total_km = max(r["trip_km"], odo_distance)
+    total_liters = r["total_liters"]
+
+    avg_consumption = 0
+
+    # Try calculating from fuel logs first
+    if odo_distance > 0 and r["used_liters"] > 0:
+        avg_consumption = (r["used_liters"] / odo_distance) * 100
+
+    # If no valid fuel logs to calculate, fallback to vehicle default
+    if avg_consumption == 0:
+        if default_vehicle_id:
+            vehicle = await db.vehicle.find_unique(where={"id": default_vehicle_id})
+        else:
+            vehicle = await load_first_vehicle(db, user_id)
+        if vehicle:
+            avg_consumption = vehicle.avgConsumption or 0
+
+    # If STILL zero, fallback to naive total_liters / total_km if total_km > 0
+    if avg_consumption == 0 and total_km > 0 and total_liters > 0:
+        avg_consumption = (total_liters / total_km) * 100
+
+    return {
+        "total_km": round(total_km, 2),
+        "total_spend": round(r["total_spend"], 2),
+        "avg_consumption": round(avg_consumption, 2),
+        "trip_count": r["trip_count"],
+        "max_speed": round(r["max_speed"], 1),
+        "avg_speed": round(r["avg_speed"], 1)
+    }
+
+# --- SAYFALAMA (keyset) ---
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+# fields= ile istenebilecek kolonlar (ilişkiler hariç)
+TRIP_LIST_FIELDS = {
+    "id", "startTime", "endTime", "startKm", "endKm", "distanceKm", "isActive",
+    "pointCount", "speedSum", "maxSpeed", "gpsDistanceKm", "lastLatitude", "lastLongitude",
+    "movingSeconds", "idleSeconds", "harshAccelCount", "harshBrakeCount", "speedHistogram",
+    "analyzedAt", "vehicleId", "userId"
+}
+FUEL_LOG_FIELDS = {
+    "id", "liters", "totalPrice", "currentKm", "date", "stationName", "fuelType", "vehicleId", "userId"
+}
+
+def encode_cursor(ts: datetime, row_id: str) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci (cursor).")
+
+def parse_fields(fields: Optional[str], allowed: set) -> Optional[set]:
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Bilinmeyen alan(lar): {', '.join(sorted(unknown))}")
+    # İmleç üretebilmek için id her zaman döner
+    return requested | {"id"}
+
+async def find_page(delegate, where: dict, time_field: str, limit: Optional[int], cursor: Optional[str], fields: Optional[set]):
+    # (time_field, id) üzerinden azalan sırada keyset sayfalama.
+    # limit ve cursor yoksa eski istemciler için tüm liste döner.
+    def project(rows):
+        return rows if fields is None else [model_to_dict(r, include=fields) for r in rows]
+
+    if limit is None and cursor is None:
+        return project(await delegate.find_many(where=where, order={time_field: "desc"}))
+
+    take = limit or PAGE_SIZE_DEFAULT
+    if cursor:
+        last_ts, last_id = decode_cursor(cursor)
+        where = {**where, "OR": [
+            {time_field: {"lt": last_ts}},
+            {time_field: {"equals": last_ts}, "id": {"lt": last_id}}
+        ]}
+    rows = await delegate.find_many(
+        where=where,
+        order=[{time_field: "desc"}, {"id": "desc"}],
+        take=take + 1
+    )
+    next_cursor = None
+    if len(rows) > take:
+        rows = rows[:take]
+        next_cursor = encode_cursor(getattr(rows[-1], time_field), rows[-1].id)
+    return {"items": project(rows), "nextCursor": next_cursor}
+
+# --- ARAÇ KATALOĞU (bellek içi indeks) ---
+
+CAR_CATALOG_CHECK_SECONDS = float(os.getenv("CAR_CATALOG_CHECK_SECONDS", "60"))
+
+class CarCatalog:
+    # marka -> model -> yıllar. Anahtarlar casefold, gösterilen isim ilk görülen yazım.
+    # CarLibrary nadiren değiştiği için /cars/makes|models|years Postgres'e gitmeden buradan cevaplanır.
+
+    def __init__(self):
+        self.brands = {}
+        self.fingerprint = None
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+        self._brand_keys = None
+
+    @staticmethod
+    def _key(value: str) -> str:
+        return (value or "").strip().casefold()
+
+    def add(self, brand: str, model: str, year: int):
+        if not brand:
+            return
+        entry = self.brands.setdefault(self._key(brand), {"name": brand, "models": {}, "model_keys": None})
+        if model:
+            model_entry = entry["models"].setdefault(self._key(model), {"name": model, "years": set()})
+            if year:
+                model_entry["years"].add(year)
+            entry["model_keys"] = None
+        self._brand_keys = None
+
+    @staticmethod
+    def _prefixed(keys: List[str], prefix: Optional[str]) -> List[str]:
+        if not prefix:
+            return keys
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\U0010ffff", lo=start)
+        return keys[start:end]
+
+    def makes(self, prefix: Optional[str] = None) -> List[str]:
+        if self._brand_keys is None:
+            self._brand_keys = sorted(self.brands)
+        return [self.brands[k]["name"] for k in self._prefixed(self._brand_keys, self._key(prefix))]
+
+    def models(self, make: str, prefix: Optional[str] = None) -> List[str]:
+        entry = self.brands.get(self._key(make))
+        if not entry:
+            return []
+        if entry["model_keys"] is None:
+            entry["model_keys"] = sorted(entry["models"])
+        return [entry["models"][k]["name"] for k in self._prefixed(entry["model_keys"], self._key(prefix))]
+
+    def years(self, make: str, model: str) -> List[int]:
+        entry = self.brands.get(self._key(make))
+        model_entry = entry["models"].get(self._key(model)) if entry else None
+        return sorted(model_entry["years"], reverse=True) if model_entry else []
+
+    async def _fetch_fingerprint(self, db):
+        rows = await db.query_raw('SELECT COUNT(*)::int AS n, MAX("createdAt") AS last FROM "CarLibrary"')
+        return (rows[0]["n"], rows[0]["last"]) if rows else None
+
+    async def load(self, db):
+        fingerprint = await self._fetch_fingerprint(db)
+        rows = await db.query_raw(
+            'SELECT DISTINCT "brand", "model", "year" FROM "CarLibrary" ORDER BY "brand", "model", "year"'
+        )
+        fresh = CarCatalog()
+        for r in rows:
+            fresh.add(r["brand"], r["model"], r["year"])
+        # Tek atamayla değiştir; okuyucular yarım indeks görmez
+        self.brands, self._brand_keys = fresh.brands, None
+        self.fingerprint = fingerprint
+        self.checked_at = time.monotonic()
+        print(f"Car catalog loaded: {len(self.brands)} brands, {len(rows)} rows")
+
+    async def ensure_fresh(self, db):
+        # Diğer worker'ların eklediği araçlar için belli aralıklarla sürüm (satır sayısı + son createdAt) kontrolü
+        if self.fingerprint is not None and time.monotonic() - self.checked_at < CAR_CATALOG_CHECK_SECONDS:
+            return
+        async with self.lock:
+            if self.fingerprint is not None and time.monotonic() - self.checked_at < CAR_CATALOG_CHECK_SECONDS:
+                return
+            if self.fingerprint is None or await self._fetch_fingerprint(db) != self.fingerprint:
+                await self.load(db)
+            else:
+                self.checked_at = time.monotonic()
+
+car_catalog = CarCatalog()
+
+# /cars/search sonuçları: (normalize sorgu, limit) -> hits
+search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "2000")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "300"))
+)
+search_flight = SingleFlight()
+
+def normalize_search_query(q: str) -> str:
+    return " ".join(q.casefold().split())
+
+async def search_cars_cached(q: str, limit: int) -> list:
+    key = (normalize_search_query(q), limit)
+    hits = search_cache.get(key)
+    if hits is not None:
+        return hits
+
+    async def fetch():
+        res = await run_meili(meili_client.index('cars').search, key[0], {'limit': limit})
+        result = res.get('hits', [])
+        search_cache.set(key, result)
+        return result
+
+    return await search_flight.do(key, fetch)
+
+# --- MEILISEARCH İNDEKSİ ---
+
+def car_to_document(car) -> dict:
+    # sync_meili.py de aynı dokümanı üretir
+    return {
+        "id": car.id,
+        "brand": car.brand,
+        "model": car.model,
+        "year": car.year,
+        "fuelType": car.fuelType,
+        "transmission": car.transmission,
+        "avgConsumption": car.avgConsumption,
+        "searchField": f"{car.brand} {car.model} {car.year}"
+    }
+
+_background_tasks = set()
+
+async def index_car(car):
+    if not meili_client:
+        return
+    try:
+        task = await run_meili(meili_client.index('cars').add_documents, [car_to_document(car)])
+        print(f"Car queued for search index: {car.id} (task {task.task_uid})")
+        search_cache.clear()
+    except Exception as e:
+        print(f"MEILI INDEX ERROR: {e}")
+
+def enqueue_car_index(car):
+    # İsteği bekletmeden arka planda indekse ekle (referans tutulmazsa task GC'ye gidebilir)
+    task = asyncio.create_task(index_car(car))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+# --- HARİCİ ARAÇ API'Sİ (Ninja) ---
+
+CAR_API_URL = os.getenv("CAR_API_URL", "https://api.api-ninjas.com/v1/cars")
+CAR_API_KEY = os.getenv("CAR_API_KEY", "jgIJMKCsES3XVItWOMmqrjv6OyQAGIMwVQ7nde05")
+CAR_API_TIMEOUT = float(os.getenv("CAR_API_TIMEOUT", "10"))
+CAR_API_NEGATIVE_TTL = float(os.getenv("CAR_API_NEGATIVE_TTL", "3600"))
+
+http_client: Optional[httpx.AsyncClient] = None
+car_api_misses = TTLCache(maxsize=5000, ttl=CAR_API_NEGATIVE_TTL)
+car_api_flight = SingleFlight()
+
+def get_http_client() -> httpx.AsyncClient:
+    # Tüm dış istekler için ortak, bağlantı havuzlu istemci
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            timeout=CAR_API_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+    return http_client
+
+async def fetch_and_save_car(make: str, model: str, year: int, miss_key):
+    print(f"Searching for car: {make} {model} {year} at {CAR_API_URL}")
+    response = await get_http_client().get(
+        CAR_API_URL,
+        params={"make": make, "model": model, "year": year},
+        headers={"X-Api-Key": CAR_API_KEY}
+    )
+    print(f"Ninja API Status: {response.status_code}")
+    if response.status_code != 200:
+        raise HTTPException(status_code=404, detail="Araç bulunamadı.")
+
+    data_list = response.json()
+    if not data_list:
+        print("Ninja API returned empty list.")
+        car_api_misses.set(miss_key, True)
+        raise HTTPException(status_code=404, detail="Araç veritabanında bulunamadı.")
+
+    api_data = data_list[0]
+    print(f"Car found: {api_data}")
+
+    # MPG -> L/100km formülü: 235.21 / MPG
+    mpg = api_data.get('combination_mpg')
+    consumption = round(235.21 / float(mpg), 2) if mpg else None
+
+    new_car = await prisma.carlibrary.create(
+        data={
+            "brand": api_data.get('make', make).capitalize(),
+            "model": api_data.get('model', model).capitalize(),
+            "year": year,
+            "fuelType": api_data.get('fuel_type'),
+            "transmission": api_data.get('transmission'),
+            "cylinders": api_data.get('cylinders'),
+            "combinationMpg": float(mpg) if mpg else None,
+            "avgConsumption": consumption
+        }
+    )
+    car_catalog.add(new_car.brand, new_car.model, new_car.year)
+    enqueue_car_index(new_car)
+    return new_car
+
 # --- ENDPOINTLER ---
 
 @app.get("/health")
@@ -117,7 +1799,9 @@ async def health():
         "endpoints": {
             "🔓 Açık": {
                 "GET /health": "API durumu ve endpoint listesi",
-                "GET /cars/makes": "Tüm araç markalarını listeler",
+                "GET /health/caches": "Önbellek isabet/ıska sayaçları",
+                "GET /ready": "Hazırlık kontrolü (DB gecikmesi, havuz doluluğu); hazır değilse 503",
+                "GET /cars/makes?prefix=bm": "Tüm araç markalarını listeler (opsiyonel önek filtresi)",
                 "GET /cars/models?make=BMW": "Markaya göre modelleri listeler",
                 "GET /cars/years?make=BMW&model=320i": "Marka+modele göre yılları listeler",
                 "GET /cars/search-and-save?make=BMW&model=320i&year=2020": "Araç detayını getirir (DB veya Ninja API)",
@@ -130,66 +1814,105 @@ async def health():
                 "POST /vehicles/add": "Yeni araç ekler",
                 "PATCH /vehicles/{id}/default": "Varsayılan aracı değiştirir",
                 "GET /dashboard/summary": "Kullanıcının özet istatistikleri",
-                "GET /trips": "Tamamlanmış yolculuk geçmişi",
+                "GET /trips?limit=50&cursor=...&fields=id,startTime": "Tamamlanmış yolculuk geçmişi (opsiyonel keyset sayfalama)",
+                "GET /fuel/logs?limit=50&cursor=...": "Yakıt geçmişi (opsiyonel keyset sayfalama)",
                 "POST /trips/start": "Yeni yolculuk başlatır",
                 "PATCH /trips/end/{id}": "Yolculuğu bitirir",
                 "POST /trips/{id}/location": "Tekli konum kaydeder",
-                "POST /trips/{id}/locations/bulk": "Toplu konum kaydeder",
+                "POST /trips/{id}/locations/bulk": "Toplu konum kaydeder (JSON veya application/x-otolog-points)",
+                "GET /trips/{id}/full-path?zoom=14&format=polyline": "Yolculuk rotası (sadeleştirilmiş / polyline)",
+                "GET /trips/{id}/path-stream?layout=columnar": "Yolculuk rotasını parça parça NDJSON olarak akıtır (son satır: done/count)",
             }
         }
     }
 
+@app.get("/health/caches")
+async def cache_stats():
+    # Önbellek boyutlandırması için isabet/ıska sayaçları
+    return {
+        "trip_ownership": trip_cache.stats(),
+        "auth_tokens": token_cache.stats(),
+        "car_search": search_cache.stats(),
+        "car_api_misses": car_api_misses.stats(),
+        "location_buffer": location_buffer.stats(),
+        "dashboard_responses": response_cache.stats(),
+        "recent_writers": recent_writers.stats()
+    }
+
+READY_QUERY_TIMEOUT = float(os.getenv("READY_QUERY_TIMEOUT", "2"))
+
+async def pool_stats(client: Prisma) -> dict:
+    # Prisma engine metrikleri (generator previewFeatures = ["metrics"])
+    try:
+        metrics = await client.get_metrics()
+    except Exception as e:
+        return {"error": str(e)}
+    gauges = {g.key: g.value for g in metrics.gauges}
+    busy = gauges.get("prisma_pool_connections_busy", 0)
+    open_connections = gauges.get("prisma_pool_connections_open", 0)
+    limit = DB_POOL_SIZE or None
+    return {
+        "limit": limit,
+        "open": open_connections,
+        "busy": busy,
+        "idle": gauges.get("prisma_pool_connections_idle", 0),
+        "waiting": gauges.get("prisma_client_queries_wait", 0),
+        "saturation": round(busy / (limit or open_connections), 3) if (limit or open_connections) else 0
+    }
+
+@app.get("/ready")
+async def readiness():
+    result = {"ready": False, "warmedUp": app_ready}
+    try:
+        started = time.perf_counter()
+        await asyncio.wait_for(prisma.query_raw("SELECT 1"), timeout=READY_QUERY_TIMEOUT)
+        result["dbLatencyMs"] = round((time.perf_counter() - started) * 1000, 1)
+        result["ready"] = app_ready
+    except Exception as e:
+        result["dbError"] = str(e) or type(e).__name__
+    result["pool"] = await pool_stats(prisma)
+    if read_prisma is not None:
+        result["readReplica"] = {
+            "available": read_db_available,
+            **(await pool_stats(read_prisma) if read_db_available else {})
+        }
+    if copy_pool is not None:
+        result["copyPool"] = {"size": copy_pool.get_size(), "idle": copy_pool.get_idle_size()}
+    return JSONResponse(result, status_code=200 if result["ready"] else 503)
+
 @app.get("/cars/makes")
-async def get_car_makes():
-    if not prisma.is_connected(): await prisma.connect()
+async def get_car_makes(prefix: Optional[str] = None):
     try:
-        makes = await prisma.carlibrary.find_many(
-            distinct=['brand'],
-            order={'brand': 'asc'}
-        )
-        return [m.brand for m in makes if m.brand]
+        await car_catalog.ensure_fresh(prisma)
+        return car_catalog.makes(prefix)
     except Exception as e:
         print(f"Error fetching makes: {e}")
         return []
 
 @app.get("/cars/search")
-async def search_cars(q: str):
+async def search_cars(q: str, limit: int = Query(50, ge=1, le=100)):
     if not meili_client:
         raise HTTPException(status_code=500, detail="Arama motoru aktif değil. (Meilisearch hatası)")
     try:
-        res = meili_client.index('cars').search(q, {'limit': 50})
-        return res.get('hits', [])
+        return await search_cars_cached(q, limit)
     except Exception as e:
         print(f"Meilisearch Error: {e}")
         raise HTTPException(status_code=500, detail="Arama başarısız, lütfen tekrar deneyin.")
 
 @app.get("/cars/models")
-async def get_car_models(make: str):
-    if not prisma.is_connected(): await prisma.connect()
+async def get_car_models(make: str, prefix: Optional[str] = None):
     try:
-        models = await prisma.carlibrary.find_many(
-            where={'brand': {'equals': make, 'mode': 'insensitive'}},
-            distinct=['model'],
-            order={'model': 'asc'}
-        )
-        return [m.model for m in models if m.model]
+        await car_catalog.ensure_fresh(prisma)
+        return car_catalog.models(make, prefix)
     except Exception as e:
         print(f"Error fetching models: {e}")
         return []
 
 @app.get("/cars/years")
 async def get_car_years(make: str, model: str):
-    if not prisma.is_connected(): await prisma.connect()
     try:
-        years = await prisma.carlibrary.find_many(
-            where={
-                'brand': {'equals': make, 'mode': 'insensitive'},
-                'model': {'equals': model, 'mode': 'insensitive'}
-            },
-            distinct=['year'],
-            order={'year': 'desc'}
-        )
-        return [str(y.year) for y in years if y.year]
+        await car_catalog.ensure_fresh(prisma)
+        return [str(y) for y in car_catalog.years(make, model)]
     except Exception as e:
         print(f"Error fetching years: {e}")
         return []
@@ -197,8 +1920,6 @@ async def get_car_years(make: str, model: str):
 @app.get("/cars/search-and-save")
 async def search_and_save(make: str, model: str, year: int):
     # 1. Önce kendi DB'mizde var mı bak?
-    if not prisma.is_connected(): await prisma.connect()
-    
     existing_car = await prisma.carlibrary.find_first(
         where={
             "brand": {"equals": make, "mode": "insensitive"},
@@ -211,41 +1932,13 @@ async def search_and_save(make: str, model: str, year: int):
         return existing_car
 
     # 2. DB'de yoksa Ninja API'ye git
-    headers = {'X-Api-Key': 'jgIJMKCsES3XVItWOMmqrjv6OyQAGIMwVQ7nde05'}
-    url = f'https://api.api-ninjas.com/v1/cars?make={make}&model={model}&year={year}'
-    
-    print(f"Searching for car: {make} {model} {year} at {url}")
+    # Yakın zamanda API'de bulunamayanlar tekrar sorulmaz; aynı anda gelen aynı aramalar tek istekte birleşir
+    miss_key = (make.strip().casefold(), model.strip().casefold(), year)
+    if car_api_misses.get(miss_key):
+        raise HTTPException(status_code=404, detail="Araç veritabanında bulunamadı.")
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        print(f"Ninja API Status: {response.status_code}")
-        
-        if response.status_code == 200:
-            data_list = response.json()
-            if not data_list:
-                print("Ninja API returned empty list.")
-                raise HTTPException(status_code=404, detail="Araç veritabanında bulunamadı.")
-                 
-            api_data = data_list[0]
-            print(f"Car found: {api_data}")
-
-            # MPG -> L/100km formülü: 235.21 / MPG
-            mpg = api_data.get('combination_mpg')
-            consumption = round(235.21 / float(mpg), 2) if mpg else None
-            
-            new_car = await prisma.carlibrary.create(
-                data={
-                    "brand": api_data.get('make', make).capitalize(),
-                    "model": api_data.get('model', model).capitalize(),
-                    "year": year,
-                    "fuelType": api_data.get('fuel_type'),
-                    "transmission": api_data.get('transmission'),
-                    "cylinders": api_data.get('cylinders'),
-                    "combinationMpg": float(mpg) if mpg else None,
-                    "avgConsumption": consumption
-                }
-            )
-            return new_car
+        return await car_api_flight.do(miss_key, lambda: fetch_and_save_car(make, model, year, miss_key))
     except Exception as e:
         print(f"CAR API ERROR: {e}")
         traceback.print_exc()
@@ -256,13 +1949,17 @@ async def search_and_save(make: str, model: str, year: int):
 # --- ARAÇ YÖNETİMİ ENDPOINTLERİ ---
 
 @app.get("/vehicles")
-async def get_my_vehicles(current_user_id: str = Depends(get_current_user)):
+async def get_my_vehicles(request: Request, response: Response, current_user_id: str = Depends(get_current_user)):
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        return await prisma.vehicle.find_many(
+        check = await not_modified(prisma, request, response, current_user_id)
+        if check.response:
+            return check.response
+        vehicles = await prisma.vehicle.find_many(
             where={"userId": current_user_id},
             order={"createdAt": "desc"}
         )
+        # isDefault, sürüm sorgusunda okunan User.defaultVehicleId'den türetilir
+        return [{**model_to_dict(v), "isDefault": v.id == check.defaultVehicleId} for v in vehicles]
     except Exception as e:
         print(f"GET VEHICLES ERROR: {e}")
         raise HTTPException(status_code=500, detail="Araçlarınız listelenemedi.")
@@ -278,12 +1975,6 @@ class VehicleAdd(BaseModel):
 @app.post("/vehicles/add")
 async def add_vehicle(data: VehicleAdd, current_user_id: str = Depends(get_current_user)):
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        
-        # Eğer bu ilk araçsa direct default yap
-        count = await prisma.vehicle.count(where={"userId": current_user_id})
-        is_default = (count == 0)
-        
         new_vehicle = await prisma.vehicle.create(
             data={
                 "userId": current_user_id,
@@ -292,11 +1983,17 @@ async def add_vehicle(data: VehicleAdd, current_user_id: str = Depends(get_curre
                 "year": data.year,
                 "fuelType": data.fuelType,
                 "transmission": data.transmission,
-                "avgConsumption": data.avgConsumption,
-                "isDefault": is_default
+                "avgConsumption": data.avgConsumption
             }
         )
-        return new_vehicle
+        # Kullanıcının varsayılan aracı yoksa (ilk araç) bunu varsayılan yap
+        is_default = await prisma.execute_raw(
+            'UPDATE "User" SET "defaultVehicleId" = $1 WHERE id = $2 AND "defaultVehicleId" IS NULL',
+            new_vehicle.id, current_user_id
+        ) == 1
+        version = await bump_data_version(prisma, current_user_id)
+        await invalidate_responses(current_user_id, version, SUMMARY_ENDPOINT)
+        return {**model_to_dict(new_vehicle), "isDefault": is_default}
     except Exception as e:
         print(f"ADD VEHICLE ERROR: {e}")
         traceback.print_exc()
@@ -305,31 +2002,30 @@ async def add_vehicle(data: VehicleAdd, current_user_id: str = Depends(get_curre
 @app.patch("/vehicles/{vehicle_id}/default")
 async def set_default_vehicle(vehicle_id: str, current_user_id: str = Depends(get_current_user)):
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        
-        async with prisma.tx() as transaction:
-            # 1. Önce kullanıcının tüm araçlarının default'unu false yap
-            await transaction.vehicle.update_many(
-                where={"userId": current_user_id},
-                data={"isDefault": False}
-            )
-            
-            # 2. Seçilen aracı true yap
-            updated = await transaction.vehicle.update(
-                where={"id": vehicle_id},
-                data={"isDefault": True}
-            )
-            return updated
+        # Araç bu kullanıcıya aitse tek satır güncellenir
+        vehicle = await prisma.vehicle.find_first(
+            where={"id": vehicle_id, "userId": current_user_id}
+        )
+        if not vehicle:
+            raise HTTPException(status_code=404, detail="Araç bulunamadı.")
+
+        rows = await prisma.query_raw(
+            'UPDATE "User" SET "defaultVehicleId" = $1, "dataVersion" = "dataVersion" + 1 WHERE id = $2 RETURNING "dataVersion"',
+            vehicle_id, current_user_id
+        )
+        mark_user_write(current_user_id)
+        # Özetteki tüketim varsayılan araca düşebilir
+        await invalidate_responses(current_user_id, rows[0]["dataVersion"], SUMMARY_ENDPOINT)
+        return {**model_to_dict(vehicle), "isDefault": True}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"SET DEFAULT ERROR: {e}")
-        # Transaction hatası oluşursa
         raise HTTPException(status_code=500, detail="Varsayılan araç güncellenemedi.")
 
 @app.delete("/vehicles/{vehicle_id}")
 async def delete_vehicle(vehicle_id: str, current_user_id: str = Depends(get_current_user)):
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        
         # Aracın bu kullanıcıya ait olduğunu doğrula
         vehicle = await prisma.vehicle.find_first(
             where={"id": vehicle_id, "userId": current_user_id}
@@ -338,10 +2034,13 @@ async def delete_vehicle(vehicle_id: str, current_user_id: str = Depends(get_cur
         if not vehicle:
             raise HTTPException(status_code=404, detail="Araç bulunamadı.")
         
-        if vehicle.isDefault:
+        user = await prisma.user.find_unique(where={"id": current_user_id})
+        if user and user.defaultVehicleId == vehicle_id:
             raise HTTPException(status_code=400, detail="Varsayılan araç silinemez. Önce başka bir aracı varsayılan yapın.")
         
         await prisma.vehicle.delete(where={"id": vehicle_id})
+        version = await bump_data_version(prisma, current_user_id)
+        await invalidate_responses(current_user_id, version, SUMMARY_ENDPOINT)
         return {"status": "success", "message": "Araç silindi."}
     except HTTPException:
         raise
@@ -356,18 +2055,11 @@ async def add_fuel(data: FuelCreate, current_user_id: str = Depends(get_current_
         if data.userId != current_user_id:
              raise HTTPException(status_code=403, detail="Kendi kullanıcı ID'niz ile işlem yapmalısınız.")
          
-        if not prisma.is_connected(): await prisma.connect()
-
-        # Varsayılan aracı bul (FuelLog hangi araca ait?)
-        user = await prisma.user.find_unique(
-            where={"id": current_user_id},
-            include={"vehicles": True}
-        )
-        if not user or not user.vehicles:
+        # Varsayılan araç (FuelLog hangi araca ait?) veritabanından okunur
+        default_vehicle = await load_default_vehicle(prisma, current_user_id)
+        if not default_vehicle:
              raise HTTPException(status_code=400, detail="Yakıt eklemek için önce araç oluşturmalısınız.")
 
-        default_vehicle = next((v for v in user.vehicles if v.isDefault), user.vehicles[0])
-
         new_entry = await prisma.fuellog.create(
             data={
                 "userId": current_user_id,
@@ -380,6 +2072,9 @@ async def add_fuel(data: FuelCreate, current_user_id: str = Depends(get_current_
                 "fuelType": default_vehicle.fuelType or "Bilinmiyor"
             }
         )
+        await refresh_daily_stats_safe(prisma, current_user_id, new_entry.date)
+        version = await bump_data_version(prisma, current_user_id)
+        await invalidate_responses(current_user_id, version, SUMMARY_ENDPOINT, DAILY_STATS_ENDPOINT)
         return {"status": "success", "data": new_entry}
     except HTTPException:
         raise
@@ -388,17 +2083,30 @@ async def add_fuel(data: FuelCreate, current_user_id: str = Depends(get_current_
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Yakıt kaydı oluşturulamadı.")
 
-@app.get("/fuel/logs")
-async def get_fuel_logs(userId: Optional[str] = None, current_user_id: str = Depends(get_current_user)):
+@app.get("/fuel/logs", response_class=FastJSONResponse)
+async def get_fuel_logs(
+    request: Request,
+    response: Response,
+    userId: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user_id: str = Depends(get_current_user)
+):
     active_id = userId if (userId and userId != "undefined") else current_user_id
     if active_id != current_user_id:
         raise HTTPException(status_code=403, detail="Yetkisiz erişim.")
+    projection = parse_fields(fields, FUEL_LOG_FIELDS)
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        return await prisma.fuellog.find_many(
-            where={"userId": active_id},
-            order={"date": "desc"}
+        db, version_row = await get_read_db(active_id)
+        check = await not_modified(db, request, response, active_id, version_row)
+        if check.response:
+            return check.response
+        return fast_json(
+            await find_page(db.fuellog, {"userId": active_id}, "date", limit, cursor, projection), response
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"FUEL LOGS ERROR: {e}")
         raise HTTPException(status_code=500, detail="Yakıt geçmişi alınamadı.")
@@ -409,16 +2117,16 @@ class PremiumSync(BaseModel):
 @app.post("/premium/sync")
 async def sync_premium(data: PremiumSync, current_user_id: str = Depends(get_current_user)):
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        
         updated_user = await prisma.user.update(
             where={"id": current_user_id},
             data={
                 "isLifetimePro": True,
                 "purchaseDate": datetime.now(),
-                "transactionId": data.transactionId
+                "transactionId": data.transactionId,
+                "dataVersion": {"increment": 1}
             }
         )
+        mark_user_write(current_user_id)
         return {"status": "success", "isLifetimePro": updated_user.isLifetimePro}
     except Exception as e:
         print(f"PREMIUM SYNC ERROR: {e}")
@@ -432,43 +2140,30 @@ async def device_login(request: Request, x_device_id: Optional[str] = Header(Non
         raise HTTPException(status_code=400, detail="Cihaz kimliği (X-Device-ID) eksik.")
         
     try:
-        if not prisma.is_connected():
-            await prisma.connect()
-            
-        # Kullanıcıyı cihaz ID'si ile ara
-        user = await prisma.user.find_unique(
-            where={"deviceId": dev_id},
-            include={"vehicles": True}
-        )
-        
-        # Eğer böyle bir kullanıcı yoksa, sadece cihaz ID'si ile oluştur
-        if not user:
-            print(f"Creating zero-auth user for device: {dev_id}")
-            user = await prisma.user.create(
-                data={
-                    "deviceId": dev_id,
-                    "name": "Sürücü"
-                },
-                include={"vehicles": True}
-            )
-            print("Zero-auth user created (no default vehicle).")
-
-        # Varsayılan aracı belirle
-        default_vehicle = next((v for v in user.vehicles if v.isDefault), user.vehicles[0] if user.vehicles else None)
+        # Kullanıcıyı cihaz ID'si ile bul, yoksa sadece cihaz ID'si ile oluştur (tek sorgu)
+        user = await login_device(prisma, dev_id)
+        if user["created"]:
+            print(f"Zero-auth user created for device: {dev_id}")
+            # Yeni kullanıcı replikaya ulaşmadan ilk okumalar birincilden yapılsın
+            mark_user_write(user["id"])
+        default_vehicle_id = user["defaultVehicleId"]
+        if default_vehicle_id is None and not user["created"]:
+            first_vehicle = await load_first_vehicle(prisma, user["id"])
+            default_vehicle_id = first_vehicle.id if first_vehicle else None
         
         # Güvenli JWT üret (Identity = User ID)
-        token = create_access_token(data={"sub": user.id})
+        token = create_access_token(data={"sub": user["id"]})
         
         return {
             "status": "success",
             "access_token": token,
             "token_type": "bearer",
             "user": {
-                "id": user.id,
-                "name": user.name,
-                "isLifetimePro": user.isLifetimePro
+                "id": user["id"],
+                "name": user["name"],
+                "isLifetimePro": user["isLifetimePro"]
             },
-            "defaultVehicleId": default_vehicle.id if default_vehicle else None
+            "defaultVehicleId": default_vehicle_id
         }
     except Exception as e:
         print(f"DEVICE LOGIN CRITICAL ERROR: {str(e)}")
@@ -484,8 +2179,6 @@ async def delete_trip(trip_id: str, userId: Optional[str] = None, current_user_i
         raise HTTPException(status_code=403, detail="Yetkisiz veri erişimi.")
         
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        
         # Verify ownership
         trip = await prisma.trip.find_unique(where={"id": trip_id})
         if not trip:
@@ -494,8 +2187,15 @@ async def delete_trip(trip_id: str, userId: Optional[str] = None, current_user_i
             raise HTTPException(status_code=403, detail="Bu yolculuğu silme yetkiniz yok.")
             
         # Prisma will handle cascade deletes if set in schema, otherwise we delete points first
+        await location_buffer.discard(trip_id)
+        trip_cache.pop(trip_id)
         await prisma.locationpoint.delete_many(where={"tripId": trip_id})
+        await prisma.trippath.delete_many(where={"tripId": trip_id})
         await prisma.trip.delete(where={"id": trip_id})
+        if not trip.isActive:
+            await refresh_daily_stats_safe(prisma, active_id, trip.startTime)
+        version = await bump_data_version(prisma, active_id)
+        await invalidate_responses(active_id, version, SUMMARY_ENDPOINT, DAILY_STATS_ENDPOINT)
         
         return {"status": "success", "message": "Yolculuk başarıyla silindi"}
     except Exception as e:
@@ -505,106 +2205,22 @@ async def delete_trip(trip_id: str, userId: Optional[str] = None, current_user_i
         raise HTTPException(status_code=500, detail="Yolculuk silinemedi.")
 
 @app.get("/dashboard/daily-stats")
-async def get_daily_stats(userId: Optional[str] = None, period: str = "weekly", current_user_id: str = Depends(get_current_user)):
+async def get_daily_stats(request: Request, response: Response, userId: Optional[str] = None, period: str = "weekly", current_user_id: str = Depends(get_current_user)):
     active_id = userId if (userId and userId != "undefined") else current_user_id
     if active_id != current_user_id:
         raise HTTPException(status_code=403, detail="Yetkisiz veri erişimi.")
         
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        
-        now = datetime.now(timezone.utc)
-        from calendar import monthrange
-        
-        if period == "yearly":
-            start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            segments = 12
-        elif period == "monthly":
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            segments = 4
-        else: # weekly
-            start_date = now - timedelta(days=now.weekday())
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            segments = 7
+        db, version_row = await get_read_db(active_id)
+        check = await not_modified(db, request, response, active_id, version_row)
+        if check.response:
+            return check.response
         
-        trips = await prisma.trip.find_many(
-            where={
-                "userId": active_id, 
-                "isActive": False,
-                "startTime": {"gte": start_date}
-            }
-        )
-        
-        fuels = await prisma.fuellog.find_many(
-            where={
-                "userId": active_id,
-                "date": {"gte": start_date}
-            }
+        period, start_date, segments = daily_stats_window(period, datetime.now(timezone.utc))
+        return await cached_payload(
+            active_id, DAILY_STATS_ENDPOINT, daily_stats_cache_period(period, start_date), check.version, response,
+            lambda: compute_daily_stats(db, active_id, period, start_date, segments)
         )
-        
-        trip_ids = [t.id for t in trips]
-        speed_stats = []
-        if trip_ids:
-            speed_stats = await prisma.locationpoint.group_by(
-                by=['tripId'],
-                where={"tripId": {"in": trip_ids}},
-                avg={'speed': True},
-                max={'speed': True}
-            )
-            
-        speed_stats_map = {s.get('tripId'): s for s in speed_stats if s.get('tripId')}
-        
-        daily_stats = []
-        for i in range(segments):
-            if period == "yearly":
-                seg_start = start_date.replace(month=i+1)
-                if i == 11:
-                    seg_end = seg_start.replace(year=seg_start.year+1, month=1)
-                else:
-                    seg_end = start_date.replace(month=i+2)
-            elif period == "monthly":
-                seg_start = start_date + timedelta(days=i*7)
-                if i == 3:
-                    _, last_day = monthrange(now.year, now.month)
-                    seg_end = start_date + timedelta(days=last_day)
-                else:
-                    seg_end = start_date + timedelta(days=(i+1)*7)
-            else:
-                seg_start = start_date + timedelta(days=i)
-                seg_end = seg_start + timedelta(days=1)
-            
-            day_trips = [t for t in trips if t.startTime and seg_start <= t.startTime < seg_end]
-            day_fuels = [f for f in fuels if f.date and seg_start <= f.date < seg_end]
-            
-            day_km = sum(t.distanceKm or 0 for t in day_trips)
-            day_spend = sum(f.totalPrice for f in day_fuels)
-            
-            day_max_speed = 0
-            valid_avgs = []
-            
-            for t in day_trips:
-                s_stat = speed_stats_map.get(t.id)
-                if s_stat:
-                    trip_max = s_stat.get('_max', {}).get('speed') or 0
-                    if trip_max > day_max_speed:
-                        day_max_speed = trip_max
-                    
-                    trip_avg = s_stat.get('_avg', {}).get('speed') or 0
-                    if trip_avg > 0:
-                        valid_avgs.append(trip_avg)
-                        
-            day_avg_speed = sum(valid_avgs) / len(valid_avgs) if valid_avgs else 0
-                
-            daily_stats.append({
-                "day_index": i,
-                "total_km": round(day_km, 2),
-                "total_spend": round(day_spend, 2),
-                "trip_count": len(day_trips),
-                "max_speed": round(day_max_speed, 1),
-                "avg_speed": round(day_avg_speed, 1)
-            })
-            
-        return daily_stats
     except Exception as e:
         print(f"DAILY STATS ERROR: {e}")
         import traceback
@@ -612,86 +2228,48 @@ async def get_daily_stats(userId: Optional[str] = None, period: str = "weekly",
         raise HTTPException(status_code=500, detail="Günlük istatistikler alınamadı.")
 
 @app.get("/dashboard/summary")
-async def get_summary(userId: Optional[str] = None, current_user_id: str = Depends(get_current_user)):
+async def get_summary(request: Request, response: Response, userId: Optional[str] = None, current_user_id: str = Depends(get_current_user)):
     # Güvenlik Kontrolü: Sadece kendi verisini görebilir
     active_id = userId if (userId and userId != "undefined") else current_user_id
     if active_id != current_user_id:
         raise HTTPException(status_code=403, detail="Yetkisiz veri erişimi.")
         
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        trips = await prisma.trip.find_many(where={"userId": active_id, "isActive": False})
-        
-        # Order fuel logs correctly by currentKm to find distance
-        fuel = await prisma.fuellog.find_many(where={"userId": active_id}, order={"currentKm": "asc"})
-        
-        # Odometer differences from fuel logs
-        odo_distance = 0
-        if len(fuel) >= 2:
-            odo_distance = fuel[-1].currentKm - fuel[0].currentKm
-
-        trip_km = sum(t.distanceKm or 0 for t in trips)
-        
-        total_km = max(trip_km, odo_distance)
-        total_spend = sum(f.totalPrice for f in fuel)
-        total_liters = sum(f.liters for f in fuel)
-        
-        avg_consumption = 0
-        
-        # Try calculating from fuel logs first
-        if odo_distance > 0:
-            used_liters = sum(f.liters for f in fuel[1:]) # liters consumed during odo_distance
-            if used_liters > 0:
-                avg_consumption = (used_liters / odo_distance) * 100
-                
-        # If no valid fuel logs to calculate, fallback to vehicle default
-        if avg_consumption == 0:
-            user_data = await prisma.user.find_unique(where={"id": active_id}, include={"vehicles": True})
-            if user_data and user_data.vehicles:
-                default_vehicle = next((v for v in user_data.vehicles if v.isDefault), user_data.vehicles[0])
-                avg_consumption = default_vehicle.avgConsumption or 0
-
-        # If STILL zero, fallback to naive total_liters / total_km if total_km > 0
-        if avg_consumption == 0 and total_km > 0 and total_liters > 0:
-            avg_consumption = (total_liters / total_km) * 100
-
-        # Performance Metrics: Max and Avg Speed
-        speed_stats = await prisma.locationpoint.group_by(
-            by=['tripId'],
-            where={"trip": {"userId": active_id, "isActive": False}},
-            avg={'speed': True},
-            max={'speed': True}
+        db, version_row = await get_read_db(active_id)
+        check = await not_modified(db, request, response, active_id, version_row)
+        if check.response:
+            return check.response
+        return await cached_payload(
+            active_id, SUMMARY_ENDPOINT, "all", check.version, response, lambda: compute_summary(db, active_id, check.defaultVehicleId)
         )
-        max_speed = 0
-        avg_speed = 0
-        if speed_stats:
-            max_speed = max((s.get('_max', {}).get('speed') or 0) for s in speed_stats)
-            valid_avgs = [s.get('_avg', {}).get('speed') or 0 for s in speed_stats if s.get('_avg', {}).get('speed')]
-            avg_speed = sum(valid_avgs) / len(valid_avgs) if valid_avgs else 0
-
-        return {
-            "total_km": round(total_km, 2),
-            "total_spend": round(total_spend, 2),
-            "avg_consumption": round(avg_consumption, 2),
-            "trip_count": len(trips),
-            "max_speed": round(max_speed, 1),
-            "avg_speed": round(avg_speed, 1)
-        }
     except Exception as e:
         print(f"SUMMARY ERROR: {e}")
         raise HTTPException(status_code=500, detail="Özet raporu hazırlanamadı.")
 
-@app.get("/trips")
-async def get_trips(userId: Optional[str] = None, current_user_id: str = Depends(get_current_user)):
+@app.get("/trips", response_class=FastJSONResponse)
+async def get_trips(
+    request: Request,
+    response: Response,
+    userId: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user_id: str = Depends(get_current_user)
+):
     active_id = userId if (userId and userId != "undefined") else current_user_id
     if active_id != current_user_id:
         raise HTTPException(status_code=403, detail="Yetkisiz erişim.")
+    projection = parse_fields(fields, TRIP_LIST_FIELDS)
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        return await prisma.trip.find_many(
-            where={"userId": active_id, "isActive": False},
-            order={"startTime": "desc"}
-        )
+        db, version_row = await get_read_db(active_id)
+        check = await not_modified(db, request, response, active_id, version_row)
+        if check.response:
+            return check.response
+        return fast_json(await find_page(
+            db.trip, {"userId": active_id, "isActive": False}, "startTime", limit, cursor, projection
+        ), response)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"TRIPS ERROR: {e}")
         raise HTTPException(status_code=500, detail="Yolculuk geçmişi alınamadı.")
@@ -701,7 +2279,6 @@ async def start_trip(data: TripStart, current_user_id: str = Depends(get_current
     if data.userId != current_user_id:
         raise HTTPException(status_code=403, detail="Geçersiz kullanıcı ID.")
     try:
-        if not prisma.is_connected(): await prisma.connect()
         new_trip = await prisma.trip.create(
             data={
                 "userId": current_user_id,
@@ -710,15 +2287,19 @@ async def start_trip(data: TripStart, current_user_id: str = Depends(get_current
                 "isActive": True
             }
         )
+        cache_trip(new_trip)
+        await bump_data_version(prisma, current_user_id)
         return new_trip
     except Exception as e:
         print(f"START TRIP ERROR: {e}")
         raise HTTPException(status_code=500, detail="Yolculuk başlatılamadı.")
 
 @app.patch("/trips/end/{trip_id}")
-async def end_trip(trip_id: str, data: TripEnd, current_user_id: str = Depends(get_current_user)):
+async def end_trip(trip_id: str, data: TripEnd, background_tasks: BackgroundTasks, current_user_id: str = Depends(get_current_user)):
     try:
-        if not prisma.is_connected(): await prisma.connect()
+        # Tamponda bekleyen ve o an yazılmakta olan noktalar bitsin ki özet alanları son hâliyle kapansın
+        await location_buffer.flush_trip(trip_id)
+        trip_cache.pop(trip_id)
         updated_trip = await prisma.trip.update(
             where={"id": trip_id},
             data={
@@ -728,6 +2309,11 @@ async def end_trip(trip_id: str, data: TripEnd, current_user_id: str = Depends(g
                 "isActive": False
             }
         )
+        await refresh_daily_stats_safe(prisma, updated_trip.userId, updated_trip.startTime)
+        version = await bump_data_version(prisma, updated_trip.userId)
+        await invalidate_responses(updated_trip.userId, version, SUMMARY_ENDPOINT, DAILY_STATS_ENDPOINT)
+        # Nokta bazlı analiz istek süresine eklenmesin
+        background_tasks.add_task(analyze_trip_safe, trip_id)
         return updated_trip
     except Exception as e:
         print(f"END TRIP ERROR: {e}")
@@ -736,15 +2322,25 @@ async def end_trip(trip_id: str, data: TripEnd, current_user_id: str = Depends(g
 @app.post("/trips/{trip_id}/location")
 async def record_location(trip_id: str, data: LocationPointCreate, current_user_id: str = Depends(get_current_user)):
     try:
-        db = await get_prisma()
+        db = prisma
         
-        # Trip kontrolü (Opsiyonel ama güvenli)
-        trip = await db.trip.find_unique(where={"id": trip_id})
-        if not trip:
-            raise HTTPException(status_code=404, detail="Yolculuk bulunamadı.")
-            
+        # Trip varlık + sahiplik kontrolü (önbellekten)
+        await get_owned_trip(db, trip_id, current_user_id)
+        mark_user_write(current_user_id)
+
+        # id baştan üretilir; tampona alınan nokta da istemciye aynı id ile döner
+        point_id = new_id()
+        if LOCATION_BUFFER_ENABLED:
+            # Nokta hemen kabul edilir, tampondan toplu olarak yazılır
+            await location_buffer.add(
+                trip_id, point_id, data.latitude, data.longitude, data.speed or 0,
+                data.timestamp or datetime.now(timezone.utc)
+            )
+            return {"status": "success", "id": point_id, "queued": True}
+
         point = await db.locationpoint.create(
             data={
+                "id": point_id,
                 "tripId": trip_id,
                 "latitude": data.latitude,
                 "longitude": data.longitude,
@@ -752,7 +2348,10 @@ async def record_location(trip_id: str, data: LocationPointCreate, current_user_
                 "timestamp": data.timestamp or datetime.now(timezone.utc)
             }
         )
+        await update_trip_stats(db, trip_id, [data.latitude], [data.longitude], [data.speed or 0])
         return {"status": "success", "id": point.id}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"RECORD LOCATION ERROR: {e}")
         traceback.print_exc()
@@ -760,61 +2359,205 @@ async def record_location(trip_id: str, data: LocationPointCreate, current_user_
 
 
 @app.post("/trips/{trip_id}/locations/bulk")
-async def bulk_record_locations(trip_id: str, data: LocationsBulk, current_user_id: str = Depends(get_current_user)):
+async def bulk_record_locations(trip_id: str, request: Request, current_user_id: str = Depends(get_current_user)):
+    # Gövde JSON (LocationsBulk) ya da application/x-otolog-points paketli format olabilir
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    body = await request.body()
     try:
-        if not data.locations:
+        if content_type == PACKED_POINTS_MEDIA_TYPE:
+            lats, lons, speeds, times_ms = decode_packed_points(body, request.headers.get("content-encoding"))
+            timestamps = ms_to_datetimes(times_ms)
+        else:
+            data = LocationsBulk(**json.loads(body))
+            now = datetime.now(timezone.utc)
+            lats = [loc.latitude for loc in data.locations]
+            lons = [loc.longitude for loc in data.locations]
+            speeds = [loc.speed or 0 for loc in data.locations]
+            timestamps = [loc.timestamp or now for loc in data.locations]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Geçersiz konum paketi: {e}")
+
+    try:
+        if not len(lats):
             return {"status": "success", "count": 0}
             
-        db = await get_prisma()
+        db = prisma
         
-        # Trip kontrolü
-        trip = await db.trip.find_unique(where={"id": trip_id})
-        if not trip:
-             raise HTTPException(status_code=404, detail="Yolculuk bulunamadı.")
+        # Trip varlık + sahiplik kontrolü (önbellekten)
+        trip = await get_owned_trip(db, trip_id, current_user_id)
+        mark_user_write(current_user_id)
 
-        # create_many kullanarak çok daha hızlı kayıt
-        record_data = [
-            {
-                "tripId": trip_id,
-                "latitude": loc.latitude,
-                "longitude": loc.longitude,
-                "speed": loc.speed or 0,
-                "timestamp": loc.timestamp or datetime.now(timezone.utc)
-            }
-            for loc in data.locations
-        ]
-        
-        count = await db.locationpoint.create_many(data=record_data)
+        # create_many / COPY ile toplu kayıt (+ Trip özet alanları)
+        count = await store_locations(db, trip_id, lats, lons, speeds, timestamps)
+        if not trip.isActive:
+            # Bitmiş yolculuğa sonradan gelen (offline) noktalar hız özetini değiştirir
+            # Sürüm TRIP_STATS_SQL içinde arttı; önbellekteki eski özet zaten okunmaz
+            await refresh_daily_stats_safe(db, trip.userId, trip.startTime)
         return {"status": "success", "count": count}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"BULK LOCATION ERROR: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Toplu konum kaydı başarısız: {str(e)}")
 
 
-@app.get("/trips/{trip_id}/full-path")
-async def get_trip_full_path(trip_id: str, current_user_id: str = Depends(get_current_user)):
+@app.get("/trips/{trip_id}/full-path", response_class=FastJSONResponse)
+async def get_trip_full_path(
+    trip_id: str,
+    tolerance: Optional[float] = Query(None, ge=0),
+    zoom: Optional[int] = Query(None, ge=0, le=22),
+    output_format: str = Query("json", alias="format"),
+    current_user_id: str = Depends(get_current_user)
+):
+    # tolerance: metre cinsinden sadeleştirme toleransı
+    # zoom: verilmişse (ve tolerance yoksa) o zoom'da 1 piksellik tolerans kullanılır
+    # format=polyline: noktalar yerine Google encoded polyline döner
+    if output_format not in ("json", "polyline"):
+        raise HTTPException(status_code=400, detail="Geçersiz format. (json veya polyline)")
     try:
-        if not prisma.is_connected(): await prisma.connect()
-        trip = await prisma.trip.find_unique(
+        db, _ = await get_read_db(current_user_id)
+        trip = await db.trip.find_unique(
             where={"id": trip_id},
-            include={"locations": True}
+            include={"locations": {"order_by": {"timestamp": "asc"}}, "path": True}
         )
         if not trip or trip.userId != current_user_id:
             raise HTTPException(status_code=404, detail="Yolculuk bulunamadı.")
-        return trip
+
+        if trip.path:
+            # Sıkıştırılmış yolculuk: blob + (varsa) sonradan gelmiş satırlar
+            lats, lons, speeds, times_ms = merge_columns(decode_trip_path(trip.path), points_to_columns(trip.locations or []))
+            locations = [
+                {"latitude": lat, "longitude": lon, "speed": speed, "timestamp": ts, "tripId": trip.id}
+                for lat, lon, speed, ts in zip(lats.tolist(), lons.tolist(), speeds.tolist(), ms_to_datetimes(times_ms))
+            ]
+            coords = list(zip(lats.tolist(), lons.tolist()))
+        else:
+            locations = trip.locations or []
+            coords = [(p.latitude, p.longitude) for p in locations]
+        original_count = len(locations)
+
+        if tolerance is None and zoom is not None and coords:
+            tolerance = zoom_to_tolerance(zoom, coords[0][0])
+        if tolerance:
+            kept = simplify_path(coords, tolerance)
+            locations = [locations[i] for i in kept]
+            coords = [coords[i] for i in kept]
+
+        if output_format == "polyline":
+            return {
+                "id": trip.id,
+                "startTime": trip.startTime,
+                "endTime": trip.endTime,
+                "distanceKm": trip.distanceKm,
+                "pointCount": len(coords),
+                "originalPointCount": original_count,
+                "polyline": encode_polyline(coords)
+            }
+
+        return fast_json({**model_to_dict(trip, exclude={"locations", "path"}), "locations": locations})
     except HTTPException:
         raise
     except Exception as e:
         print(f"FULL PATH ERROR: {e}")
         raise HTTPException(status_code=500, detail="Yolculuk detayları alınamadı.")
 
-@app.on_event("startup")
+@app.get("/trips/{trip_id}/path-stream")
+async def stream_trip_path(
+    trip_id: str,
+    layout: str = Query("ndjson"),
+    chunk: int = Query(1000, ge=100, le=5000),
+    current_user_id: str = Depends(get_current_user)
+):
+    # layout=ndjson: her satır bir nokta
+    # layout=columnar: her satır bir parça; lat[], lon[], speed[], t[] (epoch ms) dizileri
+    if layout not in ("ndjson", "columnar"):
+        raise HTTPException(status_code=400, detail="Geçersiz layout. (ndjson veya columnar)")
+    db, _ = await get_read_db(current_user_id)
+    try:
+        trip = await db.trip.find_unique(where={"id": trip_id}, include={"path": True})
+        if not trip or trip.userId != current_user_id:
+            raise HTTPException(status_code=404, detail="Yolculuk bulunamadı.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"PATH STREAM ERROR: {e}")
+        raise HTTPException(status_code=500, detail="Yolculuk detayları alınamadı.")
+
+    async def column_chunks():
+        if trip.path:
+            # Blob zaten sıkıştırılmış dizi; açıp parça parça gönder
+            columns = await load_trip_columns(db, trip_id, trip.path)
+            for start in range(0, len(columns[0]), chunk):
+                yield [c[start:start + chunk].tolist() for c in columns]
+        else:
+            async for points in iter_trip_points(db, trip_id, chunk):
+                yield [c.tolist() for c in points_to_columns(points)]
+
+    async def body():
+        # Son satır her zaman {"done": ...}; istemci eksik (kesilmiş) rotayı bununla anlar
+        count = 0
+        try:
+            async for lats, lons, speeds, times_ms in column_chunks():
+                if layout == "columnar":
+                    yield json.dumps({
+                        "lat": lats,
+                        "lon": lons,
+                        "speed": speeds,
+                        "t": times_ms
+                    }, separators=(",", ":")) + "\n"
+                else:
+                    yield "".join(
+                        json.dumps({
+                            "latitude": lat,
+                            "longitude": lon,
+                            "speed": speed,
+                            "timestamp": ts
+                        }, default=json_default, separators=(",", ":")) + "\n"
+                        for lat, lon, speed, ts in zip(lats, lons, speeds, ms_to_datetimes(times_ms))
+                    )
+                count += len(lats)
+        except Exception as e:
+            # Başlıklar gönderildiği için burada HTTP hatası dönülemez; hata son satırda bildirilir
+            print(f"PATH STREAM ERROR: {e}")
+            traceback.print_exc()
+            yield json.dumps({"done": False, "count": count, "error": "Rota akışı yarıda kesildi."}) + "\n"
+            return
+        yield json.dumps({"done": True, "count": count}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
 async def startup():
-    if not prisma.is_connected():
-        await prisma.connect()
+    global app_ready, compaction_task
+    await connect_prisma(prisma)
+    # Isınma: ilk istek engine/havuz açılışını beklemesin
+    await prisma.query_raw("SELECT 1")
+    try:
+        await car_catalog.load(prisma)
+    except Exception as e:
+        # İlk istekte tekrar denenir
+        print(f"Car catalog load failed: {e}")
+    if LOCATION_BUFFER_ENABLED:
+        location_buffer.start()
+    await init_copy_pool()
+    await connect_read_db()
+    if TRIP_COMPACTION_INTERVAL_MINUTES > 0:
+        compaction_task = asyncio.create_task(compaction_loop())
+    app_ready = True
 
-@app.on_event("shutdown")
 async def shutdown():
+    global app_ready
+    # /ready 503 dönsün ki yük dengeleyici yeni istek göndermesin
+    app_ready = False
+    # Tamponda bekleyen konumlar bağlantı kapanmadan yazılmalı
+    if compaction_task is not None:
+        compaction_task.cancel()
+    await location_buffer.close()
+    await close_copy_pool()
+    await response_cache.close()
+    if http_client is not None:
+        await http_client.aclose()
+    meili_executor.shutdown(wait=False)
+    await disconnect_read_db()
     if prisma.is_connected():
         await prisma.disconnect()
@@ -0,0 +1,35 @@
+import asyncio
+from prisma import Client
+from app.main import refresh_daily_stats, utc_day_start
+
+# UserDailyStats tablosunu mevcut Trip ve FuelLog kayıtlarından doldurur.
+# Tekrar çalıştırılabilir: her gün upsert ile baştan hesaplanır.
+# Not: Trip hız özetleri için önce backfill_trip_stats.py çalıştırılmalı.
+
+async def main():
+    prisma = Client()
+    await prisma.connect()
+
+    users = await prisma.user.find_many()
+    print(f"Toplam {len(users)} kullanıcı işlenecek.")
+
+    total_days = 0
+    for i, user in enumerate(users):
+        trips = await prisma.trip.find_many(where={"userId": user.id, "isActive": False})
+        fuels = await prisma.fuellog.find_many(where={"userId": user.id})
+
+        days = {utc_day_start(t.startTime) for t in trips if t.startTime}
+        days |= {utc_day_start(f.date) for f in fuels if f.date}
+
+        for day in sorted(days):
+            await refresh_daily_stats(prisma, user.id, day)
+        total_days += len(days)
+
+        if i % 50 == 0:
+            print(f"📦 {i} kullanıcı işlendi... (Gün: {total_days})")
+
+    print(f"✅ İşlem tamamlandı! {total_days} günlük özet yazıldı.")
+    await prisma.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
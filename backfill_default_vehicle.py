@@ -0,0 +1,26 @@
+import asyncio
+from prisma import Client
+
+# User.defaultVehicleId alanını eski Vehicle.isDefault bayrağından doldurur.
+# isDefault işaretli araç yoksa kullanıcının ilk eklenen aracı seçilir.
+# Tekrar çalıştırılabilir: sadece defaultVehicleId boş olan kullanıcılar güncellenir.
+BACKFILL_SQL = """
+UPDATE "User" u SET "defaultVehicleId" = v.id
+FROM (
+    SELECT DISTINCT ON ("userId") id, "userId"
+    FROM "Vehicle"
+    ORDER BY "userId", "isDefault" DESC, "createdAt" ASC, id ASC
+) v
+WHERE v."userId" = u.id AND u."defaultVehicleId" IS NULL
+"""
+
+async def main():
+    prisma = Client()
+    await prisma.connect()
+
+    updated = await prisma.execute_raw(BACKFILL_SQL)
+    print(f"✅ İşlem tamamlandı! {updated} kullanıcının varsayılan aracı yazıldı.")
+    await prisma.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+import asyncio
+from prisma import Client
+from app.main import analyze_trip
+
+# Bitmiş ama henüz analiz edilmemiş yolculukların analizlerini hesaplar.
+# Tekrar çalıştırılabilir: sadece analyzedAt boş olan yolculuklar işlenir.
+
+async def main():
+    prisma = Client()
+    await prisma.connect()
+
+    trips = await prisma.trip.find_many(where={"isActive": False, "analyzedAt": None})
+    print(f"Toplam {len(trips)} yolculuk işlenecek.")
+
+    failed = 0
+    for i, trip in enumerate(trips):
+        try:
+            await analyze_trip(prisma, trip.id)
+        except Exception as e:
+            failed += 1
+            print(f"❌ {trip.id}: {e}")
+
+        if i % 100 == 0:
+            print(f"📦 {i} yolculuk işlendi...")
+
+    print(f"✅ İşlem tamamlandı! {len(trips) - failed} yolculuk analiz edildi, {failed} hata.")
+    await prisma.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import asyncio
+from prisma import Client
+
+# Eski yolculuklar için Trip özet alanlarını (pointCount, speedSum, maxSpeed,
+# gpsDistanceKm, lastLatitude/lastLongitude) LocationPoint tablosundan hesaplar.
+# Yeni kayıtlar bu alanları ingest sırasında zaten güncelliyor.
+BACKFILL_SQL = """
+UPDATE "Trip" t SET
+    "pointCount" = s.cnt,
+    "speedSum" = s.speed_sum,
+    "maxSpeed" = s.speed_max,
+    "gpsDistanceKm" = s.dist,
+    "lastLatitude" = s.last_lat,
+    "lastLongitude" = s.last_lon
+FROM (
+    SELECT
+        COUNT(*)::int AS cnt,
+        COALESCE(SUM(speed), 0) AS speed_sum,
+        COALESCE(MAX(speed), 0) AS speed_max,
+        COALESCE(SUM(seg), 0) AS dist,
+        (ARRAY_AGG(latitude ORDER BY "timestamp" DESC, id DESC))[1] AS last_lat,
+        (ARRAY_AGG(longitude ORDER BY "timestamp" DESC, id DESC))[1] AS last_lon
+    FROM (
+        SELECT
+            latitude,
+            longitude,
+            speed,
+            "timestamp",
+            id,
+            2 * 6371.0088 * ASIN(LEAST(1, SQRT(
+                POWER(SIN(RADIANS(latitude - LAG(latitude) OVER w) / 2), 2)
+                + COS(RADIANS(LAG(latitude) OVER w)) * COS(RADIANS(latitude))
+                  * POWER(SIN(RADIANS(longitude - LAG(longitude) OVER w) / 2), 2)
+            ))) AS seg
+        FROM "LocationPoint"
+        WHERE "tripId" = $1
+        WINDOW w AS (ORDER BY "timestamp", id)
+    ) p
+) s
+WHERE t.id = $1 AND s.cnt > 0
+"""
+
+async def main():
+    prisma = Client()
+    await prisma.connect()
+
+    trips = await prisma.trip.find_many(where={"pointCount": 0})
+    print(f"Özet alanı boş {len(trips)} yolculuk bulundu.")
+
+    updated = 0
+    for i, trip in enumerate(trips):
+        updated += await prisma.execute_raw(BACKFILL_SQL, trip.id)
+        if i % 100 == 0:
+            print(f"📦 {i} yolculuk işlendi... (Güncellenen: {updated})")
+
+    print(f"✅ İşlem tamamlandı! {updated} yolculuk güncellendi.")
+    await prisma.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
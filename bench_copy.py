@@ -0,0 +1,78 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+import app.main as api
+
+# LocationPoint yazımı: Prisma create_many ile asyncpg binary COPY karşılaştırması.
+# Geçici bir yolculuk açar, her paket boyutunu iki yolla yazar, sonunda her şeyi siler.
+# Kullanım: DATABASE_URL ayarlıyken `python bench_copy.py`
+
+BATCH_SIZES = [100, 500, 1000, 2500, 5000]
+REPEATS = 3
+
+def make_batch(n):
+    start = datetime.now(timezone.utc)
+    lat, lon = 37.2150, 28.3636
+    lats, lons, speeds, times = [], [], [], []
+    for i in range(n):
+        lat += random.uniform(-1e-4, 1e-4)
+        lon += random.uniform(-1e-4, 1e-4)
+        lats.append(lat)
+        lons.append(lon)
+        speeds.append(random.uniform(0, 120))
+        times.append(start + timedelta(seconds=i))
+    return lats, lons, speeds, times
+
+async def create_many(trip_id, lats, lons, speeds, times):
+    return await api.prisma.locationpoint.create_many(
+        data=[
+            {"tripId": trip_id, "latitude": a, "longitude": b, "speed": c, "timestamp": d}
+            for a, b, c, d in zip(lats, lons, speeds, times)
+        ]
+    )
+
+async def copy(trip_id, lats, lons, speeds, times):
+    # Her tekrarda yeni id'ler gerekir (birincil anahtar çakışmasın)
+    ids = [api.new_id() for _ in lats]
+    return await api.copy_locations(trip_id, ids, lats, lons, speeds, times)
+
+async def measure(fn, trip_id, batch):
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        await fn(trip_id, *batch)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(batch[0]) / best
+
+async def main():
+    await api.prisma.connect()
+    await api.init_copy_pool()
+    if api.copy_pool is None:
+        print("asyncpg / DATABASE_URL yok, COPY ölçülemiyor.")
+        await api.prisma.disconnect()
+        return
+
+    vehicle = await api.prisma.vehicle.find_first()
+    if not vehicle:
+        print("No vehicle found")
+        await api.prisma.disconnect()
+        return
+    trip = await api.prisma.trip.create(data={"userId": vehicle.userId, "vehicleId": vehicle.id, "isActive": False})
+
+    try:
+        print(f"{'paket':>6} | {'create_many satır/sn':>20} | {'COPY satır/sn':>14} | {'oran':>5}")
+        for n in BATCH_SIZES:
+            batch = make_batch(n)
+            prisma_rate = await measure(create_many, trip.id, batch)
+            copy_rate = await measure(copy, trip.id, batch)
+            print(f"{n:>6} | {prisma_rate:>20.0f} | {copy_rate:>14.0f} | {copy_rate / prisma_rate:>4.1f}x")
+    finally:
+        await api.prisma.locationpoint.delete_many(where={"tripId": trip.id})
+        await api.prisma.trip.delete(where={"id": trip.id})
+        await api.close_copy_pool()
+        await api.prisma.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
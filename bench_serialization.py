@@ -0,0 +1,96 @@
+import gzip
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+import app.main as api
+
+# /trips/{id}/full-path cevabının serileştirme maliyeti: FastAPI'nin varsayılan yolu
+# (jsonable_encoder + json.dumps) ile FastJSONResponse (orjson) karşılaştırması.
+# Veritabanı gerekmez; 10k noktalık sentetik bir yolculuk kullanılır.
+# Kullanım: `python bench_serialization.py`
+
+POINTS = 10_000
+REPEATS = 5
+
+try:
+    from prisma.models import LocationPoint
+except ImportError:
+    # Prisma client üretilmemişse aynı alanlara sahip bir model
+    class LocationPoint(BaseModel):
+        id: str
+        latitude: float
+        longitude: float
+        speed: Optional[float] = 0
+        timestamp: datetime
+        tripId: str
+        trip: Optional[Any] = None
+
+def make_payload(n):
+    start = datetime.now(timezone.utc)
+    lat, lon = 37.2150, 28.3636
+    locations = []
+    for i in range(n):
+        lat += random.uniform(-1e-4, 1e-4)
+        lon += random.uniform(-1e-4, 1e-4)
+        locations.append(LocationPoint(
+            id=f"c{i:024d}",
+            latitude=lat,
+            longitude=lon,
+            speed=random.uniform(0, 120),
+            timestamp=start + timedelta(seconds=i),
+            tripId="bench-trip"
+        ))
+    return {
+        "id": "bench-trip",
+        "startTime": start,
+        "endTime": start + timedelta(seconds=n),
+        "distanceKm": 42.0,
+        "isActive": False,
+        "locations": locations
+    }
+
+def default_path(payload):
+    return JSONResponse(jsonable_encoder(payload)).body
+
+def fast_path(payload):
+    return api.FastJSONResponse(payload).body
+
+def measure(fn, payload):
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        body = fn(payload)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+def main():
+    payload = make_payload(POINTS)
+    print(f"{POINTS} nokta, en iyi {REPEATS} deneme (orjson: {'var' if api.orjson else 'yok'})")
+
+    default_time, default_body = measure(default_path, payload)
+    fast_time, fast_body = measure(fast_path, payload)
+    print(f"{'yol':<28} | {'süre (ms)':>9} | {'boyut (KB)':>10}")
+    print(f"{'jsonable_encoder + json':<28} | {default_time * 1000:>9.1f} | {len(default_body) / 1024:>10.0f}")
+    print(f"{'FastJSONResponse':<28} | {fast_time * 1000:>9.1f} | {len(fast_body) / 1024:>10.0f}")
+    print(f"hızlanma: {default_time / fast_time:.1f}x")
+
+    started = time.perf_counter()
+    gz = gzip.compress(fast_body, compresslevel=6)
+    gz_time = time.perf_counter() - started
+    print(f"gzip: {len(gz) / 1024:.0f} KB ({len(gz) / len(fast_body):.0%}), {gz_time * 1000:.1f} ms")
+    try:
+        import brotli
+        started = time.perf_counter()
+        br = brotli.compress(fast_body, quality=4)
+        br_time = time.perf_counter() - started
+        print(f"brotli (q4): {len(br) / 1024:.0f} KB ({len(br) / len(fast_body):.0%}), {br_time * 1000:.1f} ms")
+    except ImportError:
+        print("brotli yok, sadece gzip ölçüldü.")
+
+if __name__ == "__main__":
+    main()
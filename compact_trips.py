@@ -0,0 +1,41 @@
+import asyncio
+import sys
+from prisma import Client
+from app.main import compact_cold_trips, compact_trip, expand_trip, TRIP_COMPACT_AFTER_HOURS
+
+# Soğuk yolculuk sıkıştırma:
+#   python compact_trips.py compact [saat]   -> en az [saat] önce bitmiş yolculukları blob'a taşır
+#   python compact_trips.py compact-trip ID  -> tek yolculuğu sıkıştırır
+#   python compact_trips.py expand ID        -> blob'u tekrar LocationPoint satırlarına açar
+
+async def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("compact", "compact-trip", "expand"):
+        print("Kullanım: python compact_trips.py compact [saat] | compact-trip TRIP_ID | expand TRIP_ID")
+        return
+
+    prisma = Client()
+    await prisma.connect()
+    try:
+        command = sys.argv[1]
+        if command == "compact":
+            hours = float(sys.argv[2]) if len(sys.argv) > 2 else TRIP_COMPACT_AFTER_HOURS
+            total = 0
+            cursor = None
+            while True:
+                # (endTime, id) imleciyle parti parti; boş ya da hatalı yolculuklar döngüyü erken bitirmez
+                compacted, cursor = await compact_cold_trips(prisma, hours, cursor=cursor)
+                total += compacted
+                if cursor is None:
+                    break
+            print(f"✅ İşlem tamamlandı! Toplam {total} nokta sıkıştırıldı.")
+        elif command == "compact-trip":
+            count = await compact_trip(prisma, sys.argv[2])
+            print(f"✅ {count} nokta sıkıştırıldı.")
+        else:
+            count = await expand_trip(prisma, sys.argv[2])
+            print(f"✅ {count} nokta geri açıldı.")
+    finally:
+        await prisma.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,93 +1,99 @@
+import time
 import pandas as pd
 import asyncio
 from prisma import Prisma
 
-# L/100km hesaplama fonksiyonu (MPG -> L/100km)
-def convert_to_l100(mpg):
-    if mpg > 0:
-        return round(235.21 / mpg, 2)
-    return 0
+CSV_PATH = 'vehicles.csv'
+# CSV parça parça okunur, bellek kullanımı dosya boyutundan bağımsız kalır
+CSV_CHUNK_ROWS = 50_000
+# create_many başına satır sayısı
+INSERT_CHUNK = 5_000
+
+KEY_COLUMNS = ["brand", "model", "year"]
+
+def prepare_chunk(df):
+    # 1. 2000 yılı ve sonrasını filtrele, markası/modeli boş satırları at
+    df = df[pd.to_numeric(df['year'], errors='coerce') >= 2000].dropna(subset=['make', 'model'])
+
+    # 2. MPG -> L/100km (235.21 / MPG), tüm kolon üzerinde tek seferde
+    if 'comb08' in df.columns:
+        mpg = pd.to_numeric(df['comb08'], errors='coerce').fillna(0).astype(float)
+    else:
+        mpg = pd.Series(0.0, index=df.index)
+    consumption = (235.21 / mpg.where(mpg > 0)).round(2).fillna(0)
+
+    # EPA datasında 'fuelType1' genelde ana yakıt tipidir
+    fuel_column = 'fuelType1' if 'fuelType1' in df.columns else ('fuelType' if 'fuelType' in df.columns else None)
+    if fuel_column:
+        # Boş değerler NaN yerine None (NULL) olarak yazılsın
+        fuel_type = df[fuel_column].astype(object).where(df[fuel_column].notna(), None)
+    else:
+        fuel_type = pd.Series('Petrol', index=df.index)
+
+    cars = pd.DataFrame({
+        "brand": df['make'].astype(str).str.capitalize(),
+        "model": df['model'].astype(str).str.capitalize(),
+        "year": df['year'].astype(int),
+        "fuelType": fuel_type,
+        "avgConsumption": consumption,
+        "combinationMpg": mpg
+    })
+    # 3. Aynı (marka, model, yıl) için tek kayıt
+    return cars.drop_duplicates(subset=KEY_COLUMNS)
 
 async def main():
     prisma = Prisma()
     await prisma.connect()
 
+    print("Mevcut araç anahtarları okunuyor...")
+    rows = await prisma.query_raw('SELECT "brand", "model", "year" FROM "CarLibrary"')
+    existing = pd.MultiIndex.from_tuples(
+        [(r["brand"], r["model"], r["year"]) for r in rows], names=KEY_COLUMNS
+    ) if rows else pd.MultiIndex.from_arrays([[], [], []], names=KEY_COLUMNS)
+    print(f"Veritabanında {len(existing)} araç var.")
+
     print("Veri okunuyor...")
-    # Örnek: 'vehicles.csv' dosyasını okuyoruz
     try:
-        df = pd.read_csv('vehicles.csv', low_memory=False)
+        reader = pd.read_csv(CSV_PATH, low_memory=False, chunksize=CSV_CHUNK_ROWS)
     except Exception as e:
         print(f"Hata: {e}")
         return
 
-    # 1. 2000 yılı ve sonrasını filtrele
-    if 'year' in df.columns:
-        df_filtered = df[df['year'] >= 2000]
-    else:
-        print("'year' kolonu bulunamadı.")
+    started = time.monotonic()
+    read_rows = 0
+    count = 0
+    try:
+        for chunk in reader:
+            if 'year' not in chunk.columns:
+                print("'year' kolonu bulunamadı.")
+                return
+            read_rows += len(chunk)
+
+            cars = prepare_chunk(chunk)
+            # 4. Zaten kayıtlı olanları çıkar (anti-join)
+            keys = pd.MultiIndex.from_frame(cars[KEY_COLUMNS])
+            cars = cars[~keys.isin(existing)]
+            if cars.empty:
+                continue
+
+            records = cars.to_dict("records")
+            for i in range(0, len(records), INSERT_CHUNK):
+                count += await prisma.carlibrary.create_many(data=records[i:i + INSERT_CHUNK])
+
+            # Sonraki parçalarda tekrar eklenmesin
+            existing = existing.append(pd.MultiIndex.from_frame(cars[KEY_COLUMNS]))
+
+            elapsed = time.monotonic() - started
+            print(f"📦 {read_rows} satır işlendi... (Eklenen: {count}, {read_rows / elapsed:.0f} satır/sn)")
+    except Exception as e:
+        print(f"Yazma hatası: {e}")
         return
+    finally:
+        await prisma.disconnect()
 
-    # 2. Gereksiz sütunları at, ihtiyacımız olanları seç
-    # 'make', 'model', 'year', 'comb08' (MPG verisi)
-    cars_to_add = []
-    
-    print(f"Toplam {len(df_filtered)} satır işlenecek.")
-    
-    for index, row in df_filtered.iterrows():
-        try:
-            mpg = float(row.get('comb08', 0))
-            consumption = convert_to_l100(mpg) # Ortalama tüketim
-            
-            # EPA datasında 'fuelType1' genelde ana yakıt tipidir
-            ft = row.get('fuelType1', row.get('fuelType', 'Petrol'))
-            
-            cars_to_add.append({
-                "brand": str(row['make']).capitalize(),
-                "model": str(row['model']).capitalize(),
-                "year": int(row['year']),
-                "fuelType": str(ft),
-                "avgConsumption": consumption,
-                "combinationMpg": mpg
-            })
-        except Exception as e:
-            continue
-
-    # 3. Veritabanına Bas (Toplu işlem hızı için chunking yapıyoruz)
-    count = 0
-    print("Veritabanına yazılıyor...")
-    
-    # Batch size 50
-    batch_size = 50
-    for i in range(0, len(cars_to_add), batch_size):
-        batch = cars_to_add[i:i+batch_size]
-        
-        # Upsert mantığı kurmak zor (Unique constraint yoksa), create kullanıyoruz
-        # create_many destekleniyorsa onu kullanalım, yoksa loop
-        # SQLite/Postgres create_many destekler ama Python client bazen kısıtlı.
-        # Loop ile yapalım, user kodu öyleydi.
-        
-        for car in batch:
-            try:
-                # Mükerrer kaydı önlemek için basit kontrol (bu yavaşlatır ama güvenli)
-                exists = await prisma.carlibrary.find_first(
-                    where={
-                        "brand": car["brand"],
-                        "model": car["model"],
-                        "year": car["year"]
-                    }
-                )
-                if not exists:
-                    await prisma.carlibrary.create(data=car)
-                    count += 1
-            except Exception as e:
-                # print(f"Yazma hatası: {e}")
-                pass
-                
-        if i % 100 == 0:
-            print(f"📦 {i} araç işlendi... (Eklenen: {count})")
-
-    print(f"✅ İşlem tamamlandı! Toplam {count} yeni araç eklendi.")
-    await prisma.disconnect()
+    elapsed = time.monotonic() - started
+    print(f"✅ İşlem tamamlandı! Toplam {count} yeni araç eklendi. "
+          f"({read_rows} satır, {elapsed:.1f} sn, {read_rows / max(elapsed, 1e-9):.0f} satır/sn)")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,17 +1,84 @@
 import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import meilisearch
 from prisma import Prisma
+from app.main import car_to_document
 
 # Meilisearch ayarları
 MEILI_URL = 'https://search.ayris.tech'
 MEILI_KEY = 'qGufJ9zmsd4bgsml2I35z8MjUFGjTlwo'
 
+# Son senkronun kaldığı yer (updatedAt, id). --full ile yok sayılır.
+STATE_FILE = os.getenv("MEILI_SYNC_STATE", ".meili_sync_state.json")
+PAGE_SIZE = 1000
+BATCH_SIZE = 5000
+PARALLEL_BATCHES = 4
+
+SEARCHABLE_ATTRIBUTES = ['brand', 'model', 'searchField']
+FILTERABLE_ATTRIBUTES = ['brand', 'year', 'fuelType']
+
+def load_state():
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+        return datetime.fromisoformat(state["updatedAt"]), state["id"]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Senkron durumu okunamadı, tam senkron yapılacak: {e}")
+        return None
+
+def save_state(updated_at, car_id):
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"updatedAt": updated_at.isoformat(), "id": car_id}, f)
+    os.replace(tmp, STATE_FILE)
+
+def sync_settings(index):
+    # Ayarlar sadece farklıysa gönderilir (her ayar değişikliği index'i yeniden işletir)
+    tasks = []
+    if list(index.get_searchable_attributes()) != SEARCHABLE_ATTRIBUTES:
+        tasks.append(index.update_searchable_attributes(SEARCHABLE_ATTRIBUTES))
+    if sorted(index.get_filterable_attributes() or []) != sorted(FILTERABLE_ATTRIBUTES):
+        tasks.append(index.update_filterable_attributes(FILTERABLE_ATTRIBUTES))
+    return tasks
+
+async def iter_changed_cars(prisma, cursor):
+    # (updatedAt, id) üzerinden keyset sayfalama; bütün tablo belleğe alınmaz
+    while True:
+        where = {}
+        if cursor:
+            last_ts, last_id = cursor
+            where = {"OR": [
+                {"updatedAt": {"gt": last_ts}},
+                {"updatedAt": {"equals": last_ts}, "id": {"gt": last_id}}
+            ]}
+        page = await prisma.carlibrary.find_many(
+            where=where,
+            order=[{"updatedAt": "asc"}, {"id": "asc"}],
+            take=PAGE_SIZE
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < PAGE_SIZE:
+            return
+        cursor = (page[-1].updatedAt, page[-1].id)
+
 async def main():
+    full = "--full" in sys.argv
     prisma = None
+    executor = ThreadPoolExecutor(max_workers=PARALLEL_BATCHES)
+    loop = asyncio.get_running_loop()
     try:
         print("1. Meilisearch'e bağlanılıyor...")
         client = meilisearch.Client(MEILI_URL, MEILI_KEY)
-        
+
         # Test connection
         stats = client.health()
         print(f"Meilisearch Bağlantısı Başarılı: {stats}")
@@ -20,52 +87,69 @@ async def main():
         prisma = Prisma()
         await prisma.connect()
 
-        print("3. Bütün CarLibrary verileri çekiliyor...")
-        cars = await prisma.carlibrary.find_many()
-        
-        print(f"Buldum! Toplam {len(cars)} araç var. Meilisearch'e fırlatılıyor...")
-
-        # Meilisearch sadece JSON formatını sever (Python Dict)
-        documents = []
-        for car in cars:
-            documents.append({
-                "id": car.id,
-                "brand": car.brand,
-                "model": car.model,
-                "year": car.year,
-                "fuelType": car.fuelType,
-                "transmission": car.transmission,
-                "avgConsumption": car.avgConsumption,
-                "searchField": f"{car.brand} {car.model} {car.year}"
-            })
-
-        # Toplu şekilde index'e ekle
         index = client.index('cars')
-        
-        print("4. Filtre ve Arama kuralları ayarlanıyor (Typo toleransı vb)...")
-        index.update_searchable_attributes([
-            'brand',
-            'model',
-            'searchField'
-        ])
-        index.update_filterable_attributes([
-            'brand',
-            'year',
-            'fuelType'
-        ])
-        
-        # 1000'erli yollamak daha sağlıklı olabilir
-        batch_size = 5000
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i+batch_size]
-            task = index.add_documents(batch)
-            print(f"Batch {i} to {i+len(batch)} eklendi! Görev ID: {task.task_uid}")
-
-        print("Tebrikler! Bütün göç işlemi başarıyla tamamlandı.")
-        
+
+        print("3. Filtre ve Arama kuralları kontrol ediliyor...")
+        task_uids = [t.task_uid for t in sync_settings(index)]
+        print(f"{len(task_uids)} ayar güncellemesi gönderildi." if task_uids else "Ayarlar güncel.")
+
+        cursor = None if full else load_state()
+        print(f"4. {'Tam' if cursor is None else 'Delta'} senkron başlıyor (son nokta: {cursor})...")
+
+        started = time.monotonic()
+        sent = 0
+        last_seen = None
+        pending = []
+        batch = []
+
+        async def flush(docs):
+            task = await loop.run_in_executor(executor, index.add_documents, docs)
+            print(f"{len(docs)} doküman gönderildi. Görev ID: {task.task_uid}")
+            return task.task_uid
+
+        async for page in iter_changed_cars(prisma, cursor):
+            batch.extend(car_to_document(car) for car in page)
+            last_seen = (page[-1].updatedAt, page[-1].id)
+            if len(batch) >= BATCH_SIZE:
+                pending.append(asyncio.ensure_future(flush(batch)))
+                sent += len(batch)
+                batch = []
+                # Aynı anda en fazla PARALLEL_BATCHES batch yolda olsun
+                if len(pending) >= PARALLEL_BATCHES:
+                    task_uids.append(await pending.pop(0))
+        if batch:
+            pending.append(asyncio.ensure_future(flush(batch)))
+            sent += len(batch)
+        for p in pending:
+            task_uids.append(await p)
+
+        print(f"5. {len(task_uids)} görevin tamamlanması bekleniyor...")
+        failed = 0
+        for uid in task_uids:
+            task = await loop.run_in_executor(
+                executor, lambda uid=uid: client.wait_for_task(uid, timeout_in_ms=10 * 60 * 1000)
+            )
+            if task.status != "succeeded":
+                failed += 1
+                print(f"❌ Görev {uid}: {task.status} {task.error}")
+
+        elapsed = time.monotonic() - started
+        print(f"{sent} doküman {elapsed:.1f} sn'de işlendi, {failed} görev başarısız.")
+
+        if failed:
+            print("Son nokta güncellenmedi; bir sonraki çalıştırmada aynı aralık tekrar denenecek.")
+        elif last_seen:
+            save_state(*last_seen)
+            print(f"Son nokta kaydedildi: {last_seen}")
+        else:
+            print("Değişen kayıt yok.")
+
+        print("Tebrikler! Senkron işlemi tamamlandı.")
+
     except Exception as e:
         print(f"Bir hata oluştu: {e}")
     finally:
+        executor.shutdown(wait=False)
         if prisma:
             await prisma.disconnect()
 
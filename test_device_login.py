@@ -0,0 +1,39 @@
+import asyncio
+import sys
+import uuid
+from prisma import Prisma
+from app.main import login_device
+
+# Aynı cihazdan eşzamanlı gelen girişlerin hata vermeden aynı kullanıcıya
+# düştüğünü kontrol eder. Test kullanıcısı sonunda silinir.
+CONCURRENT_LOGINS = 20
+
+async def main():
+    prisma = Prisma()
+    await prisma.connect()
+
+    device_id = f"test-device-{uuid.uuid4()}"
+    try:
+        results = await asyncio.gather(
+            *[login_device(prisma, device_id) for _ in range(CONCURRENT_LOGINS)],
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        user_ids = {r["id"] for r in results if not isinstance(r, Exception)}
+        created = sum(1 for r in results if not isinstance(r, Exception) and r["created"])
+
+        print(f"{CONCURRENT_LOGINS} giriş: {len(errors)} hata, {len(user_ids)} farklı kullanıcı, {created} oluşturma.")
+        for e in errors:
+            print(f"❌ {e}")
+
+        ok = not errors and len(user_ids) == 1 and created == 1
+        print("✅ Başarılı" if ok else "❌ Başarısız")
+    finally:
+        await prisma.user.delete_many(where={"deviceId": device_id})
+        await prisma.disconnect()
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+import gzip
+import sys
+import time
+import numpy as np
+from app.main import (
+    PACKED_HEADER, PACKED_MAGIC, PACKED_VERSION, PACKED_BYTES_PER_POINT, MAX_PACKED_POINTS,
+    pack_points, unpack_points, decode_packed_points, verify_packed
+)
+
+# application/x-otolog-points formatının (istemci sözleşmesi) veritabanı olmadan
+# kontrolü: gidiş-dönüş, başlık/uzunluk doğrulaması, gzip sınırı, aralık kontrolleri
+# ve int32'ye sığmayan farklar.
+# Kullanım: `python test_packed_points.py`
+
+def sample(n=500):
+    rng = np.random.default_rng(42)
+    now_ms = int(time.time() * 1000)
+    lats = 37.2150 + np.cumsum(rng.uniform(-1e-4, 1e-4, n))
+    lons = 28.3636 + np.cumsum(rng.uniform(-1e-4, 1e-4, n))
+    speeds = rng.uniform(0, 120, n)
+    times_ms = now_ms - 3_600_000 + np.cumsum(rng.integers(500, 1500, n))
+    return lats, lons, speeds, times_ms
+
+def rejects(fn, *args) -> bool:
+    try:
+        fn(*args)
+    except ValueError:
+        return True
+    return False
+
+def check(name: str, ok: bool) -> bool:
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+def main():
+    lats, lons, speeds, times_ms = sample()
+    payload = pack_points(lats, lons, speeds, times_ms)
+    results = []
+
+    # Gidiş-dönüş: koordinat 1e-7, hız 0.1 hassasiyetinde, zaman birebir
+    u_lats, u_lons, u_speeds, u_times = decode_packed_points(payload)
+    results.append(check("gidiş-dönüş", (
+        len(payload) == PACKED_HEADER.size + len(lats) * PACKED_BYTES_PER_POINT
+        and np.array_equal(u_times, times_ms)
+        and np.allclose(u_lats, lats, rtol=0, atol=1e-7)
+        and np.allclose(u_lons, lons, rtol=0, atol=1e-7)
+        and np.allclose(u_speeds, speeds, rtol=0, atol=0.05 + 1e-9)
+    )))
+    results.append(check("verify_packed", not rejects(verify_packed, payload, lats, lons, speeds, times_ms)))
+    results.append(check("gzip'li gövde", np.array_equal(decode_packed_points(gzip.compress(payload))[3], times_ms)))
+    results.append(check("boş paket", len(unpack_points(pack_points([], [], [], []))[0]) == 0))
+
+    # Başlık ve uzunluk
+    results.append(check("eksik başlık", rejects(unpack_points, payload[:PACKED_HEADER.size - 1])))
+    results.append(check("yanlış sihirli bayt", rejects(unpack_points, b"XXXX" + payload[4:])))
+    wrong_version = PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION + 1, len(lats), int(times_ms[0]))
+    results.append(check("bilinmeyen sürüm", rejects(unpack_points, wrong_version + payload[PACKED_HEADER.size:])))
+    results.append(check("kesik gövde", rejects(unpack_points, payload[:-1])))
+    results.append(check("fazla bayt", rejects(unpack_points, payload + b"\x00")))
+    too_many = PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, MAX_PACKED_POINTS + 1, 0)
+    results.append(check("nokta sınırı", rejects(unpack_points, too_many)))
+
+    # gzip: bozuk akış ve açılınca sınırı aşan gövde (gzip bombası)
+    results.append(check("bozuk gzip", rejects(decode_packed_points, b"\x1f\x8b" + b"\x00" * 20)))
+    limit = PACKED_HEADER.size + MAX_PACKED_POINTS * PACKED_BYTES_PER_POINT
+    results.append(check("gzip boyut sınırı", rejects(decode_packed_points, gzip.compress(b"\x00" * (limit + 1)), "gzip")))
+
+    # Aralık kontrolleri
+    bad_lats = lats.copy()
+    bad_lats[-1] = 91
+    results.append(check("enlem aralığı", rejects(decode_packed_points, pack_points(bad_lats, lons, speeds, times_ms))))
+    bad_lons = lons.copy()
+    bad_lons[-1] = -181
+    results.append(check("boylam aralığı", rejects(decode_packed_points, pack_points(lats, bad_lons, speeds, times_ms))))
+    results.append(check("eski zaman damgası", rejects(decode_packed_points, pack_points(lats, lons, speeds, times_ms - 40 * 365 * 86_400_000))))
+    results.append(check("gelecek zaman damgası", rejects(decode_packed_points, pack_points(lats, lons, speeds, times_ms + 2 * 86_400_000))))
+
+    # int32'ye sığmayan farklar sessizce taşmamalı (sıkıştırmada veri kaybı)
+    jump_times = times_ms.copy()
+    jump_times[-1] += 30 * 86_400_000
+    results.append(check("zaman farkı taşması", rejects(pack_points, lats, lons, speeds, jump_times)))
+    # Tarih değiştirme çizgisini geçen iki nokta: 359.8° fark ~3.6e9 birim eder
+    results.append(check("boylam farkı taşması", rejects(pack_points, [0, 0], [179.9, -179.9], [0, 0], times_ms[:2])))
+
+    # Doğrulama uyuşmazlığı yakalamalı
+    other_times = times_ms.copy()
+    other_times[0] += 1
+    results.append(check("verify_packed uyuşmazlığı", rejects(verify_packed, payload, lats, lons, speeds, other_times)))
+
+    if not all(results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+import uuid
+
+# Okuma replikası yönlendirmesini iki ayrı yerel Postgres ile kontrol eder.
+# DATABASE_URL ve READ_DATABASE_URL birbirine replike OLMAYAN iki veritabanını
+# göstermeli (ikisine de `prisma db push` uygulanmış olmalı). Birincile yazılan
+# kullanıcı, okuma penceresi içinde birincilden görülür. Pencere bitince (başka
+# worker'a düşen okuma gibi) replika geride olduğu için yine birincil seçilmeli;
+# kullanıcı replikaya elle kopyalanınca okumalar replikaya gider.
+# Kullanım: DATABASE_URL=... READ_DATABASE_URL=... python test_read_routing.py
+os.environ.setdefault("READ_YOUR_WRITES_SECONDS", "1")
+
+import app.main as api
+
+async def main():
+    if api.read_prisma is None:
+        print("READ_DATABASE_URL ayarlı değil.")
+        sys.exit(1)
+
+    await api.connect_prisma(api.prisma)
+    await api.connect_read_db()
+    if not api.read_db_available:
+        print("❌ Replikaya bağlanılamadı.")
+        sys.exit(1)
+
+    device_id = f"test-device-{uuid.uuid4()}"
+    ok = True
+    try:
+        user = await api.login_device(api.prisma, device_id)
+        api.mark_user_write(user["id"])
+
+        # 1. Yazmadan hemen sonra birincilden okunmalı
+        db, _ = await api.get_read_db(user["id"])
+        found = await db.user.find_unique(where={"id": user["id"]})
+        step_ok = db is api.prisma and found is not None
+        ok &= step_ok
+        print(f"{'✅' if step_ok else '❌'} Pencere içinde: {'birincil' if db is api.prisma else 'replika'}, kullanıcı {'var' if found else 'yok'}")
+
+        # 2. Pencere bitti ama replika geride (kullanıcı orada yok): birincilde kalmalı
+        await asyncio.sleep(api.READ_YOUR_WRITES_SECONDS + 0.2)
+        db, _ = await api.get_read_db(user["id"])
+        step_ok = db is api.prisma
+        ok &= step_ok
+        print(f"{'✅' if step_ok else '❌'} Geride kalan replika: {'birincil' if db is api.prisma else 'replika'}")
+
+        # 3. Replika yetişince (aynı sürüm) okumalar replikaya gitmeli
+        await api.read_prisma.user.create(data={"id": user["id"], "deviceId": device_id, "name": user["name"]})
+        db, _ = await api.get_read_db(user["id"])
+        step_ok = db is api.read_prisma
+        ok &= step_ok
+        print(f"{'✅' if step_ok else '❌'} Yetişen replika: {'replika' if db is api.read_prisma else 'birincil'}")
+
+        # 4. Dashboard hesabı replikada hatasız çalışmalı
+        summary = await api.compute_summary(db, user["id"], user["defaultVehicleId"])
+        print(f"✅ Replikadan özet: {summary}")
+    finally:
+        await api.prisma.user.delete_many(where={"deviceId": device_id})
+        await api.read_prisma.user.delete_many(where={"deviceId": device_id})
+        await api.disconnect_read_db()
+        await api.prisma.disconnect()
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import asyncio
+import sys
+from app.main import MemoryResponseCache, RedisResponseCache
+
+# Yanıt önbelleği backend'lerinin aynı davrandığını kontrol eder.
+# Redis backend'i, fakeredis kuruluysa yerel bir taklit istemciyle denenir.
+
+async def check(cache) -> bool:
+    ok = True
+    ok &= await cache.get("u1:summary:all") is None
+    await cache.set("u1:summary:all", b'{"total_km":1}')
+    await cache.set("u2:summary:all", b'{"total_km":2}')
+    ok &= await cache.get("u1:summary:all") == b'{"total_km":1}'
+
+    # Sadece silinen anahtar düşmeli
+    await cache.delete(["u1:summary:all"])
+    ok &= await cache.get("u1:summary:all") is None
+    ok &= await cache.get("u2:summary:all") == b'{"total_km":2}'
+
+    stats = cache.stats()
+    ok &= stats["hits"] == 2 and stats["misses"] == 2
+    print(f"{cache.backend}: {'✅' if ok else '❌'} {stats}")
+    await cache.close()
+    return ok
+
+async def main():
+    results = [await check(MemoryResponseCache(maxsize=100, ttl=60))]
+    try:
+        from fakeredis import aioredis as fake_aioredis
+        results.append(await check(RedisResponseCache(fake_aioredis.FakeRedis(), ttl=60)))
+    except ImportError:
+        print("fakeredis yok, redis backend'i atlandı.")
+
+    if not all(results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+from prisma import Client
+from app.main import compute_summary
+
+# /dashboard/summary SQL toplamlarının eski Python hesaplamasıyla aynı
+# sonucu verdiğini her kullanıcı için kontrol eder.
+
+async def legacy_summary(prisma, user_id):
+    trips = await prisma.trip.find_many(where={"userId": user_id, "isActive": False})
+    fuel = await prisma.fuellog.find_many(where={"userId": user_id}, order={"currentKm": "asc"})
+
+    odo_distance = 0
+    if len(fuel) >= 2:
+        odo_distance = fuel[-1].currentKm - fuel[0].currentKm
+
+    trip_km = sum(t.distanceKm or 0 for t in trips)
+    total_km = max(trip_km, odo_distance)
+    total_spend = sum(f.totalPrice for f in fuel)
+    total_liters = sum(f.liters for f in fuel)
+
+    avg_consumption = 0
+    if odo_distance > 0:
+        used_liters = sum(f.liters for f in fuel[1:])
+        if used_liters > 0:
+            avg_consumption = (used_liters / odo_distance) * 100
+
+    if avg_consumption == 0:
+        user_data = await prisma.user.find_unique(where={"id": user_id}, include={"vehicles": True})
+        if user_data and user_data.vehicles:
+            default_vehicle = next((v for v in user_data.vehicles if v.isDefault), user_data.vehicles[0])
+            avg_consumption = default_vehicle.avgConsumption or 0
+
+    if avg_consumption == 0 and total_km > 0 and total_liters > 0:
+        avg_consumption = (total_liters / total_km) * 100
+
+    tracked = [t for t in trips if t.pointCount]
+    max_speed = max((t.maxSpeed or 0 for t in tracked), default=0)
+    valid_avgs = [t.speedSum / t.pointCount for t in tracked if t.speedSum]
+    avg_speed = sum(valid_avgs) / len(valid_avgs) if valid_avgs else 0
+
+    return {
+        "total_km": round(total_km, 2),
+        "total_spend": round(total_spend, 2),
+        "avg_consumption": round(avg_consumption, 2),
+        "trip_count": len(trips),
+        "max_speed": round(max_speed, 1),
+        "avg_speed": round(avg_speed, 1)
+    }
+
+async def main():
+    prisma = Client()
+    await prisma.connect()
+
+    users = await prisma.user.find_many()
+    mismatches = 0
+    for user in users:
+        expected = await legacy_summary(prisma, user.id)
+        actual = await compute_summary(prisma, user.id, user.defaultVehicleId)
+        # Toplama sırası farkından doğan son hane yuvarlama farklarına izin ver
+        diff = {k: (expected[k], actual[k]) for k in expected if abs(expected[k] - actual[k]) > 0.011}
+        if diff:
+            mismatches += 1
+            print(f"❌ {user.id}: {diff}")
+
+    print(f"{len(users)} kullanıcı kontrol edildi, {mismatches} uyuşmazlık.")
+    await prisma.disconnect()
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())